@@ -1,38 +1,143 @@
 import os
+import time
+
+# Début du chargement du module, pour le rapport de démarrage
+BOOT_STARTED = time.perf_counter()
+
+import sys
 import logging
-from flask import Flask, jsonify, request, render_template, session, redirect, url_for
+import importlib.util
+from contextlib import contextmanager
+from flask import Flask, Response, g, jsonify, request, render_template, session, redirect, url_for
 from flask_cors import CORS
-from datetime import datetime
+from datetime import datetime, timezone
 import uuid
+import json
+import base64
+import csv
+import io
+import hashlib
+import itertools
 import math
-from collections import defaultdict
-
-# === Import NumPy/SciPy pour calculs précis ===
+import threading
+from collections import deque
+
+from metrics import Counter, Gauge, Histogram, render as render_metrics
+
+# === Mode de démarrage ===
+# "full" : NumPy importé et schéma créé/vérifié à chaque démarrage de worker
+# "fast" : NumPy chargé au premier calcul (ou préchargé en arrière-plan une fois le
+#          serveur à l'écoute). Le schéma est créé une fois par déploiement par
+#          `python database.py migrate` (release Procfile, Pre-Deploy Command sur Render) ;
+#          le démarrage ne fait qu'un contrôle rapide (schema_ready), et ne crée le schéma
+#          lui-même, avant de servir, que si la migration n'a pas été lancée
+STARTUP_MODE = os.getenv("STARTUP_MODE", "full")
+
+# Durée (s) de chaque étape du démarrage, pour le rapport de démarrage
+STARTUP_TIMINGS = {"imports": time.perf_counter() - BOOT_STARTED}
+
+@contextmanager
+def startup_step(name):
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        STARTUP_TIMINGS[name] = time.perf_counter() - started
+
+def lazy_import(name):
+    """Module chargé au premier accès à l'un de ses attributs (ImportError s'il est absent)."""
+    if name in sys.modules:
+        return sys.modules[name]
+    spec = importlib.util.find_spec(name)
+    if spec is None:
+        raise ImportError(f"No module named '{name}'")
+    spec.loader = importlib.util.LazyLoader(spec.loader)
+    module = importlib.util.module_from_spec(spec)
+    sys.modules[name] = module
+    spec.loader.exec_module(module)
+    return module
+
+# === Import NumPy pour calculs précis (SciPy chargé seulement par trilateration_numpy) ===
 try:
-    import numpy as np
-    from scipy.optimize import least_squares
+    with startup_step("numpy"):
+        if STARTUP_MODE == "fast":
+            np = lazy_import("numpy")
+        else:
+            import numpy as np
     NUMPY_AVAILABLE = True
 except ImportError:
     NUMPY_AVAILABLE = False
 
+# === Import Flask-SocketIO pour l'ingestion persistante des ancres ===
+try:
+    with startup_step("socketio"):
+        from flask_socketio import SocketIO, emit, join_room
+    SOCKETIO_AVAILABLE = True
+except ImportError:
+    SOCKETIO_AVAILABLE = False
+
 # === Configuration Flask ===
 app = Flask(__name__)
 app.secret_key = os.getenv("SECRET_KEY", "3fb5222037e2be9d7d09019e1b46e268ec470fa2974a3981")
 CORS(app, resources={r"/api/*": {"origins": "*"}})
+socketio = SocketIO(app, cors_allowed_origins="*") if SOCKETIO_AVAILABLE else None
 
 # === Logger ===
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-# === Vérification NumPy/SciPy ===
-if NUMPY_AVAILABLE:
-    logger.info("✅ NumPy et SciPy disponibles pour calculs précis")
+# === Vérification NumPy ===
+if NUMPY_AVAILABLE and STARTUP_MODE == "fast":
+    logger.info("✅ NumPy disponible pour calculs précis (chargé à la demande)")
+elif NUMPY_AVAILABLE:
+    logger.info("✅ NumPy disponible pour calculs précis")
+else:
+    logger.warning("⚠️ NumPy non disponible, utilisation de math standard")
+
+if SOCKETIO_AVAILABLE:
+    logger.info(f"✅ Flask-SocketIO disponible (mode {socketio.async_mode})")
 else:
-    logger.warning("⚠️ NumPy/SciPy non disponibles, utilisation de math standard")
+    logger.warning("⚠️ Flask-SocketIO non disponible, ingestion RSSI via HTTP uniquement")
+
+# === Métriques (exposées sur /metrics) ===
+HTTP_REQUEST_SECONDS = Histogram(
+    "http_request_duration_seconds", "Durée des requêtes HTTP par route", ["method", "route", "status"]
+)
+STAGE_SECONDS = Histogram(
+    "tracking_stage_duration_seconds", "Durée des étapes d'ingestion RSSI et de positionnement", ["stage"]
+)
+RSSI_BADGES = Counter(
+    "rssi_badges_total", "Badges reçus par ancre, acceptés ou rejetés", ["anchor_id", "result"]
+)
+DB_POOL_CONNECTIONS = Gauge(
+    "db_pool_connections", "Connexions du pool Postgres par état", ["state"]
+)
+
+@app.before_request
+def start_request_timer():
+    g.request_started = time.perf_counter()
+
+@app.after_request
+def record_request_duration(response):
+    started = g.pop("request_started", None)
+    if started is not None:
+        # Gabarit de route (ex: /api/employees/<id>) pour borner le nombre de séries
+        route = request.url_rule.rule if request.url_rule else "<inconnue>"
+        HTTP_REQUEST_SECONDS.observe(
+            time.perf_counter() - started, request.method, route, response.status_code
+        )
+    return response
 
 # === DB imports ===
 try:
-    from database import init_db, get_db, verify_schema, DB_DRIVER
+    with startup_step("database"):
+        from database import (
+            db_connection, pool_stats,
+            insert_rssi_measurements, update_employee_positions, purge_rssi_measurements,
+            stream_query, StreamLimitReached, savepoint, upsert_salary, apply_salary_aggregate, insert_pointages,
+            migrate, schema_ready,
+            insert_employees, SALARY_COLUMNS, EMPLOYEE_COLUMNS, DB_DRIVER
+        )
     logger.info("✅ database.py importé")
 except Exception as e:
     logger.error(f"❌ Échec import database.py : {e}")
@@ -42,12 +147,22 @@ except Exception as e:
 PLACEHOLDER = "?" if DB_DRIVER == "sqlite" else "%s"
 
 # --- Initialisation DB ---
+# Mode "fast" : contrôle rapide seulement ; le schéma vient de `python database.py migrate`.
+# Sans migration (base neuve), il est créé ici, avant la première requête.
 try:
-    init_db()
-    verify_schema()
-    logger.info("✅ Base initialisée et schéma vérifié")
+    if STARTUP_MODE == "fast":
+        with startup_step("schema_check"):
+            ready = schema_ready()
+        if not ready:
+            logger.warning("⚠️ Schéma incomplet : migration au démarrage (lancer `python database.py migrate` au déploiement)")
+            with startup_step("schema"):
+                migrate()
+    else:
+        with startup_step("schema"):
+            migrate()
+        logger.info("✅ Base initialisée et schéma vérifié")
 except Exception as e:
-    logger.error(f"❌ Échec init_db/verify_schema : {e}")
+    logger.error(f"❌ Échec initialisation du schéma : {e}")
     raise
 
 # === Filtres Jinja2 ===
@@ -103,19 +218,21 @@ def login():
 # === GET employés ===
 @app.route("/api/employees", methods=["GET"])
 def get_all_employees():
-    try:
-        conn = get_db()
-        cursor = conn.cursor()
-        cursor.execute(f"SELECT * FROM employees ORDER BY nom, prenom")
-        rows = cursor.fetchall()
+    if wants_stream():
+        return ndjson_response(stream_query("SELECT * FROM employees ORDER BY nom, prenom"))
 
-        employees = (
-            [dict(row) for row in rows] if DB_DRIVER == "postgres"
-            else [dict(zip([col[0] for col in cursor.description], row)) for row in rows]
-        )
+    try:
+        with db_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute(f"SELECT * FROM employees ORDER BY nom, prenom")
+            rows = cursor.fetchall()
+
+            employees = (
+                [dict(row) for row in rows] if DB_DRIVER == "postgres"
+                else [dict(zip([col[0] for col in cursor.description], row)) for row in rows]
+            )
 
-        conn.close()
-        return jsonify({"success": True, "employees": employees})
+            return jsonify({"success": True, "employees": employees})
     except Exception as e:
         logger.error(f"❌ get_all_employees: {e}")
         return jsonify({"success": False, "message": str(e)}), 500
@@ -130,172 +247,414 @@ def add_employee():
             return jsonify({"success": False, "message": f"Champ manquant: {field}"}), 400
 
     try:
-        conn = get_db()
-        cursor = conn.cursor()
+        with db_connection() as conn:
+            cursor = conn.cursor()
 
-        new_id = str(uuid.uuid4())
-        created_at = int(datetime.now().timestamp() * 1000)
+            new_id = str(uuid.uuid4())
+            created_at = int(datetime.now().timestamp() * 1000)
 
-        cursor.execute(f"""
-            INSERT INTO employees (
-                id, nom, prenom, type, is_active, created_at,
-                email, telephone, taux_horaire, frais_ecolage,
-                profession, date_naissance, lieu_naissance
-            )
-            VALUES (
-                {PLACEHOLDER}, {PLACEHOLDER}, {PLACEHOLDER}, {PLACEHOLDER}, {PLACEHOLDER}, {PLACEHOLDER},
-                {PLACEHOLDER}, {PLACEHOLDER}, {PLACEHOLDER}, {PLACEHOLDER},
-                {PLACEHOLDER}, {PLACEHOLDER}, {PLACEHOLDER}
-            )
-        """, [
-            new_id, record["nom"], record["prenom"], record["type"],
-            record.get("is_active", 1), created_at,
-            record.get("email"), record.get("telephone"), record.get("taux_horaire"),
-            record.get("frais_ecolage"), record.get("profession"),
-            record.get("date_naissance"), record.get("lieu_naissance")
-        ])
+            cursor.execute(f"""
+                INSERT INTO employees (
+                    id, nom, prenom, type, is_active, created_at,
+                    email, telephone, taux_horaire, frais_ecolage,
+                    profession, date_naissance, lieu_naissance
+                )
+                VALUES (
+                    {PLACEHOLDER}, {PLACEHOLDER}, {PLACEHOLDER}, {PLACEHOLDER}, {PLACEHOLDER}, {PLACEHOLDER},
+                    {PLACEHOLDER}, {PLACEHOLDER}, {PLACEHOLDER}, {PLACEHOLDER},
+                    {PLACEHOLDER}, {PLACEHOLDER}, {PLACEHOLDER}
+                )
+            """, [
+                new_id, record["nom"], record["prenom"], record["type"],
+                record.get("is_active", 1), created_at,
+                record.get("email"), record.get("telephone"), record.get("taux_horaire"),
+                record.get("frais_ecolage"), record.get("profession"),
+                record.get("date_naissance"), record.get("lieu_naissance")
+            ])
 
-        conn.commit()
-        conn.close()
+            conn.commit()
+            employee_resolver.invalidate()
 
-        return jsonify({
-            "success": True,
-            "message": "Employé ajouté avec succès",
-            "id": new_id
-        }), 201
+            return jsonify({
+                "success": True,
+                "message": "Employé ajouté avec succès",
+                "id": new_id
+            }), 201
 
     except Exception as e:
         logger.error(f"❌ add_employee: {e}")
         return jsonify({"success": False, "message": str(e)}), 500
 
-# === POST ajouter salaire ===
-@app.route("/api/salary", methods=["POST"])
-def add_salary():
+# === POST import groupé d'employés (CSV / JSON) ===
+EMPLOYEE_IMPORT_BATCH = int(os.getenv("EMPLOYEE_IMPORT_BATCH", "500"))
+
+def employee_import_rows():
+    """
+    Itère les lignes du fichier importé sans le charger entièrement quand c'est possible :
+    CSV (text/csv ou champ de formulaire `file`) et NDJSON lus au fil du flux,
+    tableau JSON décodé d'un bloc. Les lignes NDJSON sont renvoyées brutes et
+    décodées par parse_employee_row, pour qu'une ligne malformée ne soit qu'une erreur de ligne.
+    """
+    content_type = request.mimetype
+    if "file" in request.files:
+        upload = request.files["file"]
+        return csv.DictReader(io.TextIOWrapper(upload.stream, encoding="utf-8-sig"))
+    if content_type == "text/csv":
+        return csv.DictReader(io.TextIOWrapper(request.stream, encoding="utf-8-sig"))
+    if content_type == "application/x-ndjson":
+        return (
+            line
+            for line in io.TextIOWrapper(request.stream, encoding="utf-8")
+            if line.strip()
+        )
+
     data = request.get_json(silent=True)
-    logger.info(f"📥 Données reçues: {data}")
+    items = data.get("employees") if isinstance(data, dict) else data
+    if not isinstance(items, list):
+        raise ValueError("Corps attendu : CSV, NDJSON ou tableau JSON d'employés")
+    return iter(items)
 
-    if not data:
-        logger.error("❌ Requête vide")
-        return jsonify({"success": False, "message": "Requête vide"}), 400
+def parse_employee_row(record, known_names=None):
+    """
+    Valide une ligne importée (dict, ou ligne NDJSON brute) ;
+    retourne la ligne EMPLOYEE_COLUMNS ou lève ValueError.
+    known_names (dédoublonnage par nom, optionnel) : lève LookupError pour un nom déjà connu.
+    """
+    if isinstance(record, str):
+        try:
+            record = json.loads(record)
+        except ValueError as e:
+            raise ValueError(f"JSON invalide: {e}")
+    if not isinstance(record, dict):
+        raise ValueError("Ligne invalide")
+    values = {key: (value.strip() if isinstance(value, str) else value) for key, value in record.items() if key}
+
+    for field in ("nom", "prenom", "type"):
+        if not values.get(field):
+            raise ValueError(f"Champ manquant: {field}")
+    for field in ("taux_horaire", "frais_ecolage"):
+        if values.get(field) in ("", None):
+            values[field] = None
+            continue
+        try:
+            values[field] = float(values[field])
+        except (ValueError, TypeError):
+            raise ValueError(f"{field} doit être un nombre")
+    try:
+        is_active = int(values.get("is_active") if values.get("is_active") not in ("", None) else 1)
+    except (ValueError, TypeError):
+        is_active = None
+    if is_active not in (0, 1):
+        raise ValueError("is_active doit valoir 0 ou 1")
+
+    name = f"{values['nom']} {values['prenom']}"
+    if known_names is not None and name in known_names:
+        raise LookupError(f"Employé '{name}' déjà présent")
+
+    for field in ("email", "telephone", "profession", "date_naissance", "lieu_naissance"):
+        values[field] = values.get(field) or None
+    values.update({
+        "id": str(uuid.uuid4()),
+        "is_active": is_active,
+        "created_at": int(datetime.now().timestamp() * 1000),
+    })
+    return [values[column] for column in EMPLOYEE_COLUMNS]
+
+@app.route("/api/employees/import", methods=["POST"])
+def import_employees():
+    """
+    Import groupé d'employés : CSV (en-têtes = colonnes de employees), NDJSON ou tableau JSON.
+    nom / prenom / type obligatoires. Deux homonymes sont deux employés : chaque ligne
+    est créée. Avec ?dedupe=name, un nom déjà connu (base ou fichier) est ignoré
+    ("duplicate"), ce qui rend l'import rejouable. Insertion par lots de
+    EMPLOYEE_IMPORT_BATCH, un commit par lot, index des badges rafraîchi une seule fois à la fin.
+    """
+    dedupe = request.args.get("dedupe") or None
+    if dedupe not in (None, "name"):
+        return jsonify({"success": False, "message": "dedupe doit valoir 'name'"}), 400
+
+    try:
+        rows = employee_import_rows()
+    except ValueError as e:
+        return jsonify({"success": False, "message": str(e)}), 400
+
+    results = []
+    counts = {"created": 0, "duplicate": 0, "error": 0}
+    try:
+        with db_connection() as conn:
+            cur = conn.cursor()
+            # ?dedupe=name : noms déjà en base (les deux ordres, comme pour la résolution des badges)
+            known_names = None
+            if dedupe == "name":
+                cur.execute("SELECT nom, prenom FROM employees")
+                known_names = set()
+                for row in cur.fetchall():
+                    nom = row[0] if DB_DRIVER == "sqlite" else row['nom']
+                    prenom = row[1] if DB_DRIVER == "sqlite" else row['prenom']
+                    known_names.update((f"{nom} {prenom}", f"{prenom} {nom}"))
+
+            # Lignes validées en attente d'insertion, et leurs résultats "created"
+            batch, pending = [], []
+
+            def flush():
+                counts["created"] += insert_employees(cur, batch)
+                conn.commit()
+                results.extend(pending)
+                batch.clear()
+                pending.clear()
+
+            try:
+                for line, record in enumerate(rows, 1):
+                    try:
+                        employee = parse_employee_row(record, known_names)
+                    except LookupError as e:
+                        counts["duplicate"] += 1
+                        results.append({"row": line, "status": "duplicate", "message": str(e)})
+                        continue
+                    except ValueError as e:
+                        counts["error"] += 1
+                        results.append({"row": line, "status": "error", "message": str(e)})
+                        continue
+
+                    if known_names is not None:
+                        nom, prenom = employee[1], employee[2]
+                        known_names.update((f"{nom} {prenom}", f"{prenom} {nom}"))
+                    batch.append(employee)
+                    pending.append({"row": line, "status": "created", "id": employee[0]})
+
+                    if len(batch) >= EMPLOYEE_IMPORT_BATCH:
+                        flush()
+            except (UnicodeDecodeError, csv.Error) as e:
+                # Fichier illisible : les lots précédents restent importés
+                flush()
+                raise ValueError(f"Fichier illisible après {len(results)} lignes: {e}")
+
+            flush()
+            cur.close()
+
+    except ValueError as e:
+        if counts["created"]:
+            employee_resolver.invalidate()
+        return jsonify({"success": False, "message": str(e), **counts}), 400
+    except Exception as e:
+        logger.error(f"❌ import_employees: {e}", exc_info=True)
+        if counts["created"]:
+            employee_resolver.invalidate()
+        return jsonify({"success": False, "message": str(e), **counts}), 500
+
+    # ✅ Un seul rafraîchissement des caches employés pour tout l'import
+    if counts["created"]:
+        employee_resolver.invalidate()
+    logger.info(
+        f"📥 Import employés: {counts['created']} créés, "
+        f"{counts['duplicate']} doublons, {counts['error']} erreurs"
+    )
+    results.sort(key=lambda result: result["row"])
+    return jsonify({"success": True, "results": results, **counts}), 200
+
+# === POST ajouter salaire ===
+def parse_salary(data):
+    """Valide un salaire reçu (format Android ou snake_case) ; lève ValueError si invalide."""
+    if not data or not isinstance(data, dict):
+        raise ValueError("Requête vide")
 
-    employee_id = data.get("employeeId") or data.get("employee_id")
     employee_name = data.get("employeeName") or data.get("employee_name")
     amount = data.get("amount")
     record_type = data.get("type")
-    hours_worked = data.get("hoursWorked") or data.get("hours_worked", 0.0)
 
     if not employee_name or not isinstance(employee_name, str) or not employee_name.strip():
         logger.error(f"❌ employeeName manquant ou vide: {repr(employee_name)}")
-        return jsonify({"success": False, "message": "Champ manquant ou vide: employeeName"}), 400
+        raise ValueError("Champ manquant ou vide: employeeName")
 
     if not amount:
         logger.error(f"❌ amount manquant")
-        return jsonify({"success": False, "message": "Champ manquant ou vide: amount"}), 400
+        raise ValueError("Champ manquant ou vide: amount")
 
     if not record_type:
         logger.error(f"❌ type manquant")
-        return jsonify({"success": False, "message": "Champ manquant ou vide: type"}), 400
+        raise ValueError("Champ manquant ou vide: type")
 
     try:
         amount = float(amount)
-        if amount <= 0:
-            logger.error(f"❌ Montant invalide: {amount}")
-            return jsonify({"success": False, "message": "Le montant doit être supérieur à 0"}), 400
     except (ValueError, TypeError):
         logger.error(f"❌ Montant non numérique: {data.get('amount')}")
-        return jsonify({"success": False, "message": "Le montant doit être un nombre valide"}), 400
+        raise ValueError("Le montant doit être un nombre valide")
+    if amount <= 0:
+        logger.error(f"❌ Montant invalide: {amount}")
+        raise ValueError("Le montant doit être supérieur à 0")
+
+    return {
+        "id": data.get("id") or str(uuid.uuid4()),
+        "employee_id": data.get("employeeId") or data.get("employee_id"),
+        "employee_name": employee_name.strip(),
+        "amount": amount,
+        "hours_worked": data.get("hoursWorked") or data.get("hours_worked", 0.0),
+        "type": record_type,
+        "period": data.get("period") or datetime.now().strftime("%Y-%m"),
+        "date": int(data.get("date", datetime.now().timestamp() * 1000)),
+    }
+
+def resolve_salary_employee(cur, employee_name, created):
+    """
+    employee_id d'après le nom (index mémoire employee_resolver), avec création
+    automatique si inconnu. `created` (nom → id) évite les doublons dans un même lot.
+    """
+    employee_id = employee_resolver.resolve(cur, employee_name) or created.get(employee_name)
+    if employee_id:
+        logger.info(f"✅ Employé trouvé par nom: {employee_id}")
+        return employee_id
+
+    logger.warning(f"⚠️ Employé '{employee_name}' non trouvé, création automatique")
+    emp_name_parts = employee_name.split(" ", 1)
+    prenom = emp_name_parts[0] if len(emp_name_parts) > 0 else "Inconnu"
+    nom = emp_name_parts[1] if len(emp_name_parts) > 1 else employee_name
+
+    employee_id = str(uuid.uuid4())
+
+    cur.execute(f"""
+        INSERT INTO employees (id, nom, prenom, type, is_active, created_at)
+        VALUES ({PLACEHOLDER}, {PLACEHOLDER}, {PLACEHOLDER}, {PLACEHOLDER}, {PLACEHOLDER}, {PLACEHOLDER})
+    """, [employee_id, nom, prenom, "employe", 1, int(datetime.now().timestamp() * 1000)])
+
+    created[employee_name] = employee_id
+    logger.info(f"✅ Nouvel employé créé: {employee_id}")
+    return employee_id
+
+# Libellés de l'action renvoyée par POST /api/salary (réponse historique en français)
+SALARY_ACTIONS = {"created": "créé", "updated": "mis à jour"}
+
+def save_salary(cur, salary):
+    """Upsert atomique du salaire + correction des agrégats ; retourne "created" ou "updated"."""
+    previous = upsert_salary(cur, [salary[column] for column in SALARY_COLUMNS])
+
+    if previous:
+        logger.warning(f"⚠️ Salaire {salary['id']} existe déjà, mise à jour au lieu d'insertion")
+        # ✅ Retirer l'ancien paiement des agrégats
+        if previous["employee_id"] is not None:
+            apply_salary_aggregate(
+                cur, previous["employee_id"], previous["period"], previous["type"],
+                -previous["amount"], -(previous["hours_worked"] or 0.0), count=-1
+            )
+
+    # ✅ Agrégats mis à jour dans la même transaction
+    apply_salary_aggregate(
+        cur, salary["employee_id"], salary["period"], salary["type"],
+        salary["amount"], salary["hours_worked"]
+    )
+    return "updated" if previous else "created"
+
+@app.route("/api/salary", methods=["POST"])
+def add_salary():
+    data = request.get_json(silent=True)
+    logger.info(f"📥 Données reçues: {data}")
 
     try:
-        conn = get_db()
-        cur = conn.cursor()
+        salary = parse_salary(data)
+    except ValueError as e:
+        return jsonify({"success": False, "message": str(e)}), 400
 
-        employee_name = employee_name.strip()
+    try:
+        with db_connection() as conn:
+            cur = conn.cursor()
 
-        if employee_id:
-            cur.execute(f"SELECT id, nom, prenom FROM employees WHERE id = {PLACEHOLDER}", (employee_id,))
-            employee = cur.fetchone()
+            created = {}
+            if not salary["employee_id"]:
+                salary["employee_id"] = resolve_salary_employee(cur, salary["employee_name"], created)
 
-            if not employee:
-                logger.warning(f"⚠️ Employé {employee_id} non trouvé")
-        else:
-            cur.execute(f"""
-                SELECT id FROM employees 
-                WHERE CONCAT(nom, ' ', prenom) = {PLACEHOLDER} 
-                   OR CONCAT(prenom, ' ', nom) = {PLACEHOLDER}
-                LIMIT 1
-            """, (employee_name, employee_name))
-            
-            employee = cur.fetchone()
-            
-            if employee:
-                employee_id = employee[0] if DB_DRIVER == "sqlite" else employee['id']
-                logger.info(f"✅ Employé trouvé par nom: {employee_id}")
-            else:
-                logger.warning(f"⚠️ Employé '{employee_name}' non trouvé, création automatique")
-                emp_name_parts = employee_name.split(" ", 1)
-                prenom = emp_name_parts[0] if len(emp_name_parts) > 0 else "Inconnu"
-                nom = emp_name_parts[1] if len(emp_name_parts) > 1 else employee_name
-                
-                employee_id = str(uuid.uuid4())
-                
-                cur.execute(f"""
-                    INSERT INTO employees (id, nom, prenom, type, is_active, created_at)
-                    VALUES ({PLACEHOLDER}, {PLACEHOLDER}, {PLACEHOLDER}, {PLACEHOLDER}, {PLACEHOLDER}, {PLACEHOLDER})
-                """, [employee_id, nom, prenom, "employe", 1, int(datetime.now().timestamp() * 1000)])
-                
-                logger.info(f"✅ Nouvel employé créé: {employee_id}")
-
-        salary_date = int(data.get("date", datetime.now().timestamp() * 1000))
-        period = data.get("period") or datetime.now().strftime("%Y-%m")
-        salary_id = data.get("id") or str(uuid.uuid4())
-
-        cur.execute(f"SELECT id FROM salaries WHERE id = {PLACEHOLDER}", (salary_id,))
-        existing = cur.fetchone()
-
-        if existing:
-            logger.warning(f"⚠️ Salaire {salary_id} existe déjà, mise à jour au lieu d'insertion")
-            
-            cur.execute(f"""
-                UPDATE salaries 
-                SET employee_id = {PLACEHOLDER}, employee_name = {PLACEHOLDER}, 
-                    amount = {PLACEHOLDER}, hours_worked = {PLACEHOLDER}, 
-                    type = {PLACEHOLDER}, period = {PLACEHOLDER}, date = {PLACEHOLDER}
-                WHERE id = {PLACEHOLDER}
-            """, [
-                employee_id, employee_name, amount, hours_worked,
-                record_type, period, salary_date, salary_id
-            ])
-            
-            action = "mis à jour"
-        else:
-            cur.execute(f"""
-                INSERT INTO salaries (id, employee_id, employee_name, amount, hours_worked, type, period, date)
-                VALUES ({PLACEHOLDER}, {PLACEHOLDER}, {PLACEHOLDER}, {PLACEHOLDER}, {PLACEHOLDER}, {PLACEHOLDER}, {PLACEHOLDER}, {PLACEHOLDER})
-            """, [
-                salary_id, employee_id, employee_name, amount, hours_worked,
-                record_type, period, salary_date
-            ])
-            
-            action = "créé"
+            status = save_salary(cur, salary)
+            action = SALARY_ACTIONS[status]
 
-        conn.commit()
-        logger.info(f"✅ Salaire {action}: ID={salary_id}, employee_id={employee_id}, amount={amount}, type={record_type}")
+            conn.commit()
+            if created:
+                employee_resolver.invalidate()
+            logger.info(
+                f"✅ Salaire {action}: ID={salary['id']}, employee_id={salary['employee_id']}, "
+                f"amount={salary['amount']}, type={salary['type']}"
+            )
 
-        cur.close()
-        conn.close()
+            cur.close()
         
-        return jsonify({
-            "success": True, 
-            "message": f"Salaire {action} avec succès", 
-            "id": salary_id,
-            "employeeId": employee_id,
-            "action": action
-        }), 201 if action == "créé" else 200
+            return jsonify({
+                "success": True, 
+                "message": f"Salaire {action} avec succès", 
+                "id": salary["id"],
+                "employeeId": salary["employee_id"],
+                "action": action
+            }), 201 if status == "created" else 200
 
     except Exception as e:
         logger.error(f"❌ add_salary: {e}", exc_info=True)
         return jsonify({"success": False, "message": str(e)}), 500
 
+# === POST synchronisation groupée des salaires ===
+SALARY_BATCH_MAX = int(os.getenv("SALARY_BATCH_MAX", "1000"))
+
+@app.route("/api/salary/batch", methods=["POST"])
+def add_salaries_batch():
+    """
+    Enregistre une liste de salaires (ex: paie du mois depuis Android) en une transaction.
+    Corps : {"salaries": [...]} (ou la liste seule), chaque élément au format de POST /api/salary.
+    Chaque élément est écrit dans un SAVEPOINT : une erreur en base (ex: employeeId inconnu)
+    n'annule que cet élément.
+    Retourne un résultat par élément : created, updated ou error.
+    """
+    data = request.get_json(silent=True)
+    items = data.get("salaries") if isinstance(data, dict) else data
+    if not isinstance(items, list) or not items:
+        return jsonify({"success": False, "message": "Liste 'salaries' manquante ou vide"}), 400
+    if len(items) > SALARY_BATCH_MAX:
+        return jsonify({
+            "success": False,
+            "message": f"Lot trop volumineux: {len(items)} > {SALARY_BATCH_MAX}"
+        }), 400
+
+    results = []
+    try:
+        with db_connection() as conn:
+            cur = conn.cursor()
+            created = {}
+
+            for item in items:
+                item_id = item.get("id") if isinstance(item, dict) else None
+                try:
+                    salary = parse_salary(item)
+                except (ValueError, TypeError) as e:
+                    results.append({"id": item_id, "status": "error", "message": str(e)})
+                    continue
+
+                created_before = set(created)
+                try:
+                    with savepoint(cur, "salary_item"):
+                        if not salary["employee_id"]:
+                            salary["employee_id"] = resolve_salary_employee(cur, salary["employee_name"], created)
+                        status = save_salary(cur, salary)
+                except Exception as e:
+                    logger.warning(f"⚠️ Salaire {salary['id']} rejeté: {e}")
+                    # L'employé créé pour cet élément a été annulé avec lui
+                    for name in set(created) - created_before:
+                        del created[name]
+                    results.append({"id": salary["id"], "status": "error", "message": str(e)})
+                    continue
+
+                results.append({
+                    "id": salary["id"],
+                    "employeeId": salary["employee_id"],
+                    "status": status
+                })
+
+            conn.commit()
+            if created:
+                employee_resolver.invalidate()
+            cur.close()
+
+        saved = sum(1 for result in results if result["status"] != "error")
+        logger.info(f"💰 Lot de salaires: {saved}/{len(results)} enregistrés")
+        return jsonify({"success": True, "results": results, "saved": saved}), 200
+
+    except Exception as e:
+        logger.error(f"❌ add_salaries_batch: {e}", exc_info=True)
+        return jsonify({"success": False, "message": str(e)}), 500
+
 # === PUT modifier employé ===
 @app.route("/api/employees/<id>", methods=["PUT"])
 def update_employee(id):
@@ -304,28 +663,28 @@ def update_employee(id):
         return jsonify({"success": False, "message": "Requête vide"}), 400
 
     try:
-        conn = get_db()
-        cur = conn.cursor()
+        with db_connection() as conn:
+            cur = conn.cursor()
 
-        cur.execute(f"""
-            UPDATE employees
-            SET nom = {PLACEHOLDER}, prenom = {PLACEHOLDER}, type = {PLACEHOLDER}, is_active = {PLACEHOLDER},
-                email = {PLACEHOLDER}, telephone = {PLACEHOLDER},
-                taux_horaire = {PLACEHOLDER}, frais_ecolage = {PLACEHOLDER},
-                profession = {PLACEHOLDER}, date_naissance = {PLACEHOLDER}, lieu_naissance = {PLACEHOLDER}
-            WHERE id = {PLACEHOLDER}
-        """, [
-            record.get("nom"), record.get("prenom"), record.get("type"), record.get("is_active", 1),
-            record.get("email"), record.get("telephone"),
-            record.get("taux_horaire"), record.get("frais_ecolage"),
-            record.get("profession"), record.get("date_naissance"), record.get("lieu_naissance"),
-            id
-        ])
-
-        conn.commit()
-        cur.close()
-        conn.close()
-        return jsonify({"success": True, "message": "Employé modifié"}), 200
+            cur.execute(f"""
+                UPDATE employees
+                SET nom = {PLACEHOLDER}, prenom = {PLACEHOLDER}, type = {PLACEHOLDER}, is_active = {PLACEHOLDER},
+                    email = {PLACEHOLDER}, telephone = {PLACEHOLDER},
+                    taux_horaire = {PLACEHOLDER}, frais_ecolage = {PLACEHOLDER},
+                    profession = {PLACEHOLDER}, date_naissance = {PLACEHOLDER}, lieu_naissance = {PLACEHOLDER}
+                WHERE id = {PLACEHOLDER}
+            """, [
+                record.get("nom"), record.get("prenom"), record.get("type"), record.get("is_active", 1),
+                record.get("email"), record.get("telephone"),
+                record.get("taux_horaire"), record.get("frais_ecolage"),
+                record.get("profession"), record.get("date_naissance"), record.get("lieu_naissance"),
+                id
+            ])
+
+            conn.commit()
+            cur.close()
+            employee_resolver.invalidate()
+            return jsonify({"success": True, "message": "Employé modifié"}), 200
     except Exception as e:
         logger.error(f"❌ update_employee: {e}")
         return jsonify({"success": False, "message": str(e)}), 500
@@ -334,121 +693,477 @@ def update_employee(id):
 @app.route("/api/employees/<id>", methods=["DELETE"])
 def delete_employee(id):
     try:
-        conn = get_db()
-        cur = conn.cursor()
-
-        # ✅ Supprimer d'abord toutes les dépendances dans l'ordre
-        cur.execute(f"DELETE FROM pointages WHERE employee_id = {PLACEHOLDER}", [id])
-        cur.execute(f"DELETE FROM rssi_measurements WHERE employee_id = {PLACEHOLDER}", [id])
-        cur.execute(f"DELETE FROM salaries WHERE employee_id = {PLACEHOLDER}", [id])
+        with db_connection() as conn:
+            cur = conn.cursor()
+
+            # ✅ Supprimer d'abord toutes les dépendances dans l'ordre
+            cur.execute(f"DELETE FROM pointages WHERE employee_id = {PLACEHOLDER}", [id])
+            cur.execute(f"DELETE FROM rssi_measurements WHERE employee_id = {PLACEHOLDER}", [id])
+            cur.execute(f"DELETE FROM salaries WHERE employee_id = {PLACEHOLDER}", [id])
+            cur.execute(f"DELETE FROM salary_aggregates WHERE employee_id = {PLACEHOLDER}", [id])
         
-        # ✅ Enfin, supprimer l'employé
-        cur.execute(f"DELETE FROM employees WHERE id = {PLACEHOLDER}", [id])
+            # ✅ Enfin, supprimer l'employé
+            cur.execute(f"DELETE FROM employees WHERE id = {PLACEHOLDER}", [id])
 
-        conn.commit()
+            conn.commit()
+            employee_resolver.invalidate()
+            rssi_window.discard(id)
+            position_tracker.discard(id)
         
-        # Vérifier combien de lignes ont été supprimées
-        if cur.rowcount == 0:
-            cur.close()
-            conn.close()
-            return jsonify({"success": False, "message": "Employé non trouvé"}), 404
+            # Vérifier combien de lignes ont été supprimées
+            if cur.rowcount == 0:
+                cur.close()
+                return jsonify({"success": False, "message": "Employé non trouvé"}), 404
         
-        cur.close()
-        conn.close()
+            cur.close()
         
-        logger.info(f"✅ Employé {id} et toutes ses données supprimés")
-        return jsonify({"success": True, "message": "Employé supprimé avec succès"}), 200
+            logger.info(f"✅ Employé {id} et toutes ses données supprimés")
+            return jsonify({"success": True, "message": "Employé supprimé avec succès"}), 200
         
     except Exception as e:
         logger.error(f"❌ delete_employee: {e}", exc_info=True)
         return jsonify({"success": False, "message": f"Erreur lors de la suppression: {str(e)}"}), 500
 
+# ========== PAGINATION DE L'HISTORIQUE ==========
+
+HISTORY_PAGE_SIZE = int(os.getenv("HISTORY_PAGE_SIZE", "200"))
+HISTORY_PAGE_MAX = 1000
+
+def encode_history_cursor(timestamp, row_id):
+    """Curseur opaque sur (timestamp, id) de la dernière ligne d'une page."""
+    raw = json.dumps([timestamp, row_id]).encode()
+    return base64.urlsafe_b64encode(raw).decode()
+
+def decode_history_cursor(value):
+    try:
+        timestamp, row_id = json.loads(base64.urlsafe_b64decode(value.encode()))
+        return int(timestamp), str(row_id)
+    except Exception:
+        raise ValueError("Curseur invalide")
+
+def history_filters(time_column, id_column, employee_column):
+    """
+    Lit limit / cursor / from / to / employee_id dans la requête.
+    Retourne (conditions SQL, paramètres, limite). Lève ValueError si invalide.
+    Les bornes from/to sont des timestamps en millisecondes (from inclus, to exclu).
+    Sans limit ni cursor, la limite est None : tout l'historique filtré est renvoyé
+    (anciens clients, dont l'application Android, qui ne suivent pas next_cursor).
+    """
+    paginated = "limit" in request.args or "cursor" in request.args
+    try:
+        limit = int(request.args.get("limit", HISTORY_PAGE_SIZE))
+        date_from = request.args.get("from")
+        date_to = request.args.get("to")
+        date_from = int(date_from) if date_from else None
+        date_to = int(date_to) if date_to else None
+    except ValueError:
+        raise ValueError("limit, from et to doivent être des entiers")
+    limit = max(1, min(limit, HISTORY_PAGE_MAX)) if paginated else None
+
+    conditions, params = [], []
+    employee_id = request.args.get("employee_id")
+    if employee_id:
+        conditions.append(f"{employee_column} = {PLACEHOLDER}")
+        params.append(employee_id)
+    if date_from is not None:
+        conditions.append(f"{time_column} >= {PLACEHOLDER}")
+        params.append(date_from)
+    if date_to is not None:
+        conditions.append(f"{time_column} < {PLACEHOLDER}")
+        params.append(date_to)
+    cursor_value = request.args.get("cursor")
+    if cursor_value:
+        # Pagination par clé : reprise strictement après la dernière ligne renvoyée
+        conditions.append(f"({time_column}, {id_column}) < ({PLACEHOLDER}, {PLACEHOLDER})")
+        params.extend(decode_history_cursor(cursor_value))
+
+    return conditions, params, limit
+
+def history_page(cur, rows, limit, time_key):
+    """Convertit les lignes (limit + 1 lues, ou toutes si limit est None) en (page, next_cursor)."""
+    records = (
+        [dict(row) for row in rows] if DB_DRIVER == "postgres"
+        else [dict(zip([col[0] for col in cur.description], row)) for row in rows]
+    )
+    next_cursor = None
+    if limit is not None and len(records) > limit:
+        records = records[:limit]
+        last = records[-1]
+        next_cursor = encode_history_cursor(last[time_key], last["id"])
+    return records, next_cursor
+
+def wants_stream():
+    """Mode streaming demandé : ?format=ndjson ou Accept: application/x-ndjson."""
+    return (
+        request.args.get("format") == "ndjson"
+        or "application/x-ndjson" in request.headers.get("Accept", "")
+    )
+
+def ndjson_response(rows, transform=None, batch_size=100):
+    """
+    Réponse NDJSON (un objet JSON par ligne) produite au fil de la lecture,
+    sans jamais matérialiser l'ensemble des lignes en mémoire.
+    La première ligne est lue avant d'envoyer les en-têtes : une erreur de requête
+    donne une réponse 500 (503 si trop d'exports sont en cours). Une erreur en cours
+    de flux termine le flux par un dernier objet {"error": ...}, pour qu'un export
+    tronqué soit détectable.
+    """
+    rows = iter(rows)
+    try:
+        first = next(rows, None)
+    except StreamLimitReached as e:
+        logger.warning(f"⚠️ Flux NDJSON refusé: {e}")
+        return jsonify({"success": False, "message": str(e)}), 503, {"Retry-After": "5"}
+    except Exception as e:
+        logger.error(f"❌ Flux NDJSON: {e}")
+        return jsonify({"success": False, "message": str(e)}), 500
+
+    def generate():
+        batch = []
+        count = 0
+        try:
+            for row in (itertools.chain([first], rows) if first is not None else ()):
+                if transform:
+                    transform(row)
+                batch.append(json.dumps(row, default=str))
+                count += 1
+                if len(batch) >= batch_size:
+                    yield "\n".join(batch) + "\n"
+                    batch = []
+            if batch:
+                yield "\n".join(batch) + "\n"
+            logger.info(f"📤 Flux NDJSON terminé: {count} lignes")
+        except Exception as e:
+            # Les en-têtes sont déjà partis : on signale l'erreur dans le flux lui-même
+            logger.error(f"❌ Flux NDJSON interrompu après {count} lignes: {e}")
+            batch.append(json.dumps({"error": str(e), "rows": count}))
+            yield "\n".join(batch) + "\n"
+        finally:
+            # Client déconnecté : rendre tout de suite la connexion et la place d'export
+            if hasattr(rows, "close"):
+                rows.close()
+
+    return Response(generate(), mimetype="application/x-ndjson")
+
 # === GET historique salaires ===
 @app.route("/api/salary/history", methods=["GET"])
 def get_salary_history():
+    """
+    Historique des salaires, plus récent d'abord, paginé sur (date, id).
+    Paramètres : limit, cursor (next_cursor de la page précédente), from, to, employee_id.
+    Sans limit ni cursor, tout l'historique filtré est renvoyé en une réponse.
+    En mode streaming (format=ndjson), toutes les lignes filtrées sont renvoyées sans limite.
+    """
     try:
-        conn = get_db()
-        cur = conn.cursor()
-        cur.execute(f"""
-            SELECT s.id, s.employee_id, s.employee_name, s.amount, s.hours_worked, 
-                   s.type, s.period, s.date,
-                   e.email, e.telephone, e.taux_horaire, e.frais_ecolage,
-                   e.date_naissance, e.lieu_naissance
-            FROM salaries s
-            LEFT JOIN employees e ON e.id = s.employee_id
-            WHERE s.employee_id IS NOT NULL 
-              AND s.employee_name IS NOT NULL 
-              AND s.employee_name != ''
-              AND s.amount > 0
-            ORDER BY s.date DESC
-        """)
-        rows = cur.fetchall()
+        conditions, params, limit = history_filters("s.date", "s.id", "s.employee_id")
+    except ValueError as e:
+        return jsonify({"success": False, "message": str(e)}), 400
+
+    filters = "".join(f"\n          AND {condition}" for condition in conditions)
+    query = f"""
+        SELECT s.id, s.employee_id, s.employee_name, s.amount, s.hours_worked, 
+               s.type, s.period, s.date,
+               e.email, e.telephone, e.taux_horaire, e.frais_ecolage,
+               e.date_naissance, e.lieu_naissance
+        FROM salaries s
+        LEFT JOIN employees e ON e.id = s.employee_id
+        WHERE s.employee_id IS NOT NULL 
+          AND s.employee_name IS NOT NULL 
+          AND s.employee_name != ''
+          AND s.amount > 0{filters}
+        ORDER BY s.date DESC, s.id DESC
+    """
 
-        salaries = (
-            [dict(row) for row in rows] if DB_DRIVER == "postgres"
-            else [dict(zip([col[0] for col in cur.description], row)) for row in rows]
-        )
+    def normalize(record):
+        if record.get("hours_worked") is None:
+            record["hours_worked"] = 0.0
+        if record.get("period") is None:
+            record["period"] = ""
 
-        for record in salaries:
-            if record.get("hours_worked") is None:
-                record["hours_worked"] = 0.0
-            if record.get("period") is None:
-                record["period"] = ""
+    if wants_stream():
+        return ndjson_response(stream_query(query, params), normalize)
 
-        cur.close()
-        conn.close()
-        logger.info(f"📤 Historique salaires renvoyé: {len(salaries)} enregistrements")
-        return jsonify({"success": True, "salaries": salaries}), 200
+    try:
+        with db_connection() as conn:
+            cur = conn.cursor()
+            if limit is None:
+                cur.execute(query, params)
+            else:
+                cur.execute(f"{query} LIMIT {PLACEHOLDER}", params + [limit + 1])
+            salaries, next_cursor = history_page(cur, cur.fetchall(), limit, "date")
+
+            for record in salaries:
+                normalize(record)
+
+            cur.close()
+            logger.info(f"📤 Historique salaires renvoyé: {len(salaries)} enregistrements")
+            return jsonify({"success": True, "salaries": salaries, "next_cursor": next_cursor}), 200
 
     except Exception as e:
         logger.error(f"❌ get_salary_history: {e}")
         return jsonify({"success": False, "message": str(e)}), 500
 
+# === GET agrégats salaires ===
+@app.route("/api/salary/aggregates", methods=["GET"])
+def get_salary_aggregates():
+    """
+    Totaux par employé, période et type (table salary_aggregates).
+    Filtres optionnels : period, employee_id. "totals" regroupe les montants par type.
+    """
+    conditions, params = [], []
+    for column in ("period", "employee_id"):
+        value = request.args.get(column)
+        if value:
+            conditions.append(f"a.{column} = {PLACEHOLDER}")
+            params.append(value)
+    where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+
+    try:
+        with db_connection() as conn:
+            cur = conn.cursor()
+            cur.execute(f"""
+                SELECT a.employee_id, a.period, a.type, a.total_amount, a.total_hours, a.count,
+                       e.nom, e.prenom
+                FROM salary_aggregates a
+                LEFT JOIN employees e ON e.id = a.employee_id
+                {where}
+                ORDER BY a.period DESC, e.nom, e.prenom, a.type
+            """, params)
+            rows = cur.fetchall()
+
+            aggregates = (
+                [dict(row) for row in rows] if DB_DRIVER == "postgres"
+                else [dict(zip([col[0] for col in cur.description], row)) for row in rows]
+            )
+
+            totals = {}
+            for record in aggregates:
+                totals[record["type"]] = totals.get(record["type"], 0.0) + record["total_amount"]
+
+            cur.close()
+            return jsonify({"success": True, "aggregates": aggregates, "totals": totals}), 200
+
+    except Exception as e:
+        logger.error(f"❌ get_salary_aggregates: {e}")
+        return jsonify({"success": False, "message": str(e)}), 500
+
 # === Dashboard ===
 @app.route("/dashboard")
 def dashboard():
+    """Page du tableau de bord ; les données (agrégats, historiques) sont chargées par l'API."""
     if not session.get("logged_in"):
         return redirect(url_for("login_page"))
+    return render_template("dashboard.html")
 
-    try:
-        conn = get_db()
-        cursor = conn.cursor()
-        cursor.execute(f"""
-            SELECT s.id, s.employee_id, s.employee_name, s.amount, s.hours_worked, 
-                   s.type AS payment_type, s.period, s.date,
-                   e.nom, e.prenom, e.type, 
-                   e.email, e.telephone, e.taux_horaire, e.frais_ecolage,
-                   e.date_naissance, e.lieu_naissance
-            FROM salaries s
-            LEFT JOIN employees e ON e.id = s.employee_id
-            ORDER BY s.date DESC
-        """)
-        rows = cursor.fetchall()
+# ========== TÂCHES DE FOND ==========
 
-        payments = (
-            [dict(row) for row in rows] if DB_DRIVER == "postgres"
-            else [dict(zip([col[0] for col in cursor.description], row)) for row in rows]
-        )
+def start_background_task(target, name):
+    """Lance une tâche de fond (green thread sous eventlet, thread daemon sinon)."""
+    if SOCKETIO_AVAILABLE:
+        socketio.start_background_task(target)
+    else:
+        threading.Thread(target=target, name=name, daemon=True).start()
+
+def background_sleep(seconds):
+    if SOCKETIO_AVAILABLE:
+        socketio.sleep(seconds)
+    else:
+        time.sleep(seconds)
+
+# Intervalle entre deux purges des mesures RSSI expirées (0 = désactivé)
+RSSI_PURGE_INTERVAL_SECONDS = float(os.getenv("RSSI_PURGE_INTERVAL_SECONDS", "600"))
 
-        conn.close()
-        return render_template("dashboard.html", payments=payments)
+_retention_lock = threading.Lock()
+_retention_started = False
+
+def start_rssi_retention():
+    """Démarre la purge périodique de rssi_measurements (une seule fois)."""
+    global _retention_started
+    if RSSI_PURGE_INTERVAL_SECONDS <= 0:
+        return
+    with _retention_lock:
+        if _retention_started:
+            return
+        _retention_started = True
+    start_background_task(_rssi_retention_loop, "rssi-retention")
+    logger.info(f"✅ Rétention RSSI démarrée (toutes les {RSSI_PURGE_INTERVAL_SECONDS:.0f}s)")
+
+def _rssi_retention_loop():
+    while True:
+        try:
+            purge_rssi_measurements()
+        except Exception as e:
+            logger.error(f"❌ Rétention RSSI: {e}", exc_info=True)
+        background_sleep(RSSI_PURGE_INTERVAL_SECONDS)
+
+# ========== RÉSOLUTION BADGE → EMPLOYÉ ==========
+
+class EmployeeResolver:
+    """
+    Index mémoire SSID / MAC → employee_id pour le chemin d'ingestion RSSI.
+    Les deux ordres de nom ("Nom Prénom" et "Prénom Nom") sont indexés,
+    les MAC sont apprises au fil des badges résolus.
+    L'index est rechargé paresseusement après chaque invalidate().
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._by_name = None
+        self._by_mac = {}
+        self._generation = 0
+        self._mac_changes = 0
+
+    @property
+    def version(self):
+        """Change à chaque invalidation ou nouvelle association MAC → employé."""
+        return (self._generation, self._mac_changes)
+
+    def macs(self):
+        """Dernière MAC connue par employee_id."""
+        # Sous verrou : resolve() ajoute des MAC pendant l'ingestion
+        with self._lock:
+            return {emp_id: mac for mac, emp_id in self._by_mac.items()}
+
+    def invalidate(self):
+        """À appeler après toute écriture sur la table employees."""
+        with self._lock:
+            self._by_name = None
+            self._by_mac = {}
+            self._generation += 1
+
+    def _load(self, cursor):
+        with self._lock:
+            generation = self._generation
+
+        cursor.execute("SELECT id, nom, prenom FROM employees")
+        by_name = {}
+        for row in cursor.fetchall():
+            emp_id = row[0] if DB_DRIVER == "sqlite" else row['id']
+            nom = row[1] if DB_DRIVER == "sqlite" else row['nom']
+            prenom = row[2] if DB_DRIVER == "sqlite" else row['prenom']
+            # setdefault : même priorité que le LIMIT 1 de l'ancienne requête
+            by_name.setdefault(f"{nom} {prenom}", emp_id)
+            by_name.setdefault(f"{prenom} {nom}", emp_id)
+
+        with self._lock:
+            # Une invalidation pendant le chargement rend ce snapshot obsolète
+            if generation == self._generation:
+                self._by_name = by_name
+        logger.info(f"🗂️ Index badges chargé: {len(by_name)} noms")
+        return by_name
+
+    def resolve(self, cursor, name, mac=None):
+        """Retourne l'employee_id du badge, ou None s'il est inconnu."""
+        by_name = self._by_name
+        if by_name is None:
+            by_name = self._load(cursor)
+
+        emp_id = by_name.get(name)
+        if emp_id is not None:
+            if mac and self._by_mac.get(mac) != emp_id:
+                with self._lock:
+                    if self._by_mac.get(mac) != emp_id:
+                        self._by_mac[mac] = emp_id
+                        self._mac_changes += 1
+            return emp_id
+
+        if mac:
+            return self._by_mac.get(mac)
+        return None
+
+
+employee_resolver = EmployeeResolver()
+
+
+class BadgeRoster:
+    """
+    Liste compacte des badges (id, nom affiché / SSID, MAC) pour les ancres ESP32 et le LCD.
+    La sérialisation JSON et son ETag sont gardés en mémoire et reconstruits
+    seulement quand employee_resolver change de version.
+    """
+
+    def __init__(self, resolver):
+        self.resolver = resolver
+        self._lock = threading.Lock()
+        self._version = None
+        self._body = None
+        self._etag = None
+
+    def get(self, cursor):
+        """Retourne (corps JSON, ETag)."""
+        version = self.resolver.version
+        if self._version == version:
+            return self._body, self._etag
+
+        cursor.execute("SELECT id, nom, prenom FROM employees ORDER BY nom, prenom")
+        macs = self.resolver.macs()
+        badges = []
+        for row in cursor.fetchall():
+            emp_id = row[0] if DB_DRIVER == "sqlite" else row['id']
+            nom = row[1] if DB_DRIVER == "sqlite" else row['nom']
+            prenom = row[2] if DB_DRIVER == "sqlite" else row['prenom']
+            # "Nom Prénom" : format du SSID diffusé par les badges
+            badges.append({"id": emp_id, "name": f"{nom} {prenom}", "mac": macs.get(emp_id)})
+
+        body = json.dumps({"success": True, "employees": badges}, separators=(",", ":"))
+        etag = hashlib.sha1(body.encode()).hexdigest()[:16]
+        with self._lock:
+            self._version, self._body, self._etag = version, body, etag
+        logger.info(f"🗂️ Roster badges reconstruit: {len(badges)} badges (ETag {etag})")
+        return body, etag
+
+
+badge_roster = BadgeRoster(employee_resolver)
+
+@app.route("/api/badges/roster", methods=["GET"])
+def get_badge_roster():
+    """Roster compact des badges, avec ETag / If-None-Match (304 si inchangé)."""
+    try:
+        with db_connection() as conn:
+            body, etag = badge_roster.get(conn.cursor())
     except Exception as e:
-        logger.error(f"❌ dashboard: {e}")
+        logger.error(f"❌ get_badge_roster: {e}")
         return jsonify({"success": False, "message": str(e)}), 500
 
-# ========== ROUTE HTTP POUR RSSI ==========
-@app.route("/api/rssi-data", methods=["POST"])
-def receive_rssi_data_http():
+    response = Response(body, mimetype="application/json")
+    response.set_etag(etag)
+    response.headers["Cache-Control"] = "no-cache"
+    return response.make_conditional(request)
+
+# ========== INGESTION RSSI (HTTP + SOCKET.IO) ==========
+
+# Ancres déclarées (firmware : ANCHOR_ID 1, 2 ou 3), en plus des ancres calibrées.
+# Seules celles-ci ont leur propre série dans les métriques, les autres id sont
+# comptés sous "unknown" : l'id vient du rapport reçu et ne doit pas multiplier les séries.
+KNOWN_ANCHOR_IDS = {
+    anchor.strip() for anchor in os.getenv("KNOWN_ANCHOR_IDS", "1,2,3").split(",") if anchor.strip()
+}
+
+def anchor_metric_label(anchor_id):
+    if str(anchor_id) in KNOWN_ANCHOR_IDS or rssi_distance_table.is_calibrated(anchor_id):
+        return str(anchor_id)
+    return "unknown"
+
+def parse_anchor_id(value):
     """
-    Reçoit les données RSSI via HTTP POST depuis ESP32
+    anchor_id d'un rapport en entier (1 et "1" désignent la même ancre).
+    Lève ValueError sinon : la valeur sert de clé aux tables, à la fenêtre et aux rooms.
     """
-    data = request.get_json(silent=True)
-    
-    if not data:
+    if isinstance(value, bool) or not isinstance(value, (int, str)):
+        raise ValueError(f"anchor_id invalide: {value!r}")
+    return int(value)
+
+def process_rssi_report(data, source):
+    """
+    Valide et enregistre un rapport d'ancre ESP32.
+    Partagé entre la route HTTP et l'évènement Socket.IO "rssi_data".
+    Retourne (réponse, code HTTP).
+    """
+    if not data or not isinstance(data, dict):
         logger.error("❌ Requête vide")
-        return jsonify({"success": False, "message": "Données vides"}), 400
+        return {"success": False, "message": "Données vides"}, 400
     
-    logger.info(f"📡 RSSI reçu via HTTP de l'Ancre #{data.get('anchor_id')}")
+    logger.info(f"📡 RSSI reçu via {source} de l'Ancre #{data.get('anchor_id')}")
     
     try:
         anchor_id = data.get("anchor_id")
@@ -457,79 +1172,232 @@ def receive_rssi_data_http():
         badges = data.get("badges", [])
         
         if anchor_id is None or anchor_x is None or anchor_y is None:
-            return jsonify({
+            return {
                 "success": False, 
                 "message": "Champs manquants: anchor_id, anchor_x, anchor_y"
-            }), 400
+            }, 400
+
+        try:
+            anchor_id = parse_anchor_id(anchor_id)
+        except ValueError:
+            return {"success": False, "message": "anchor_id doit être un entier"}, 400
         
         logger.info(f"   Position: ({anchor_x}, {anchor_y})")
         logger.info(f"   Badges détectés: {len(badges)}")
         
-        conn = get_db()
-        cur = conn.cursor()
+        with db_connection() as conn:
+            cur = conn.cursor()
         
-        processed = 0
+            timestamp = int(datetime.now().timestamp() * 1000)
+            rows = []
+            results = []
         
-        for badge in badges:
-            ssid = badge.get("ssid")
-            mac = badge.get("mac")
-            rssi = badge.get("rssi")
-            
-            if not ssid or not isinstance(ssid, str) or ssid.strip() == "":
-                logger.warning(f"   ⚠️ SSID invalide: {repr(ssid)}")
-                continue
-            
-            employee_name = ssid.strip()
-            
-            cur.execute(f"""
-                SELECT id, nom, prenom FROM employees 
-                WHERE CONCAT(nom, ' ', prenom) = {PLACEHOLDER}
-                   OR CONCAT(prenom, ' ', nom) = {PLACEHOLDER}
-                LIMIT 1
-            """, (employee_name, employee_name))
-            
-            employee = cur.fetchone()
-            
-            if not employee:
-                logger.warning(f"   ⚠️ Employé '{employee_name}' non trouvé en BDD")
-                continue
-            
-            employee_id = employee[0] if DB_DRIVER == "sqlite" else employee['id']
-            
-            cur.execute(f"""
-                INSERT INTO rssi_measurements (employee_id, anchor_id, anchor_x, anchor_y, rssi, mac, timestamp)
-                VALUES ({PLACEHOLDER}, {PLACEHOLDER}, {PLACEHOLDER}, {PLACEHOLDER}, {PLACEHOLDER}, {PLACEHOLDER}, {PLACEHOLDER})
-            """, [
-                employee_id, anchor_id, anchor_x, anchor_y, rssi, mac,
-                int(datetime.now().timestamp() * 1000)
-            ])
-            
-            processed += 1
-            logger.info(f"   ✅ {employee_name} → {rssi} dBm")
+            with STAGE_SECONDS.time("resolve"):
+                for badge in badges:
+                    ssid = badge.get("ssid")
+                    mac = badge.get("mac")
+                    rssi = badge.get("rssi")
+
+                    if not ssid or not isinstance(ssid, str) or ssid.strip() == "":
+                        logger.warning(f"   ⚠️ SSID invalide: {repr(ssid)}")
+                        results.append({"ssid": ssid, "mac": mac, "accepted": False, "reason": "SSID invalide"})
+                        continue
+
+                    employee_name = ssid.strip()
+
+                    if isinstance(rssi, bool) or not isinstance(rssi, (int, float)):
+                        logger.warning(f"   ⚠️ RSSI invalide pour '{employee_name}': {repr(rssi)}")
+                        results.append({"ssid": employee_name, "mac": mac, "accepted": False, "reason": "RSSI invalide"})
+                        continue
+
+                    employee_id = employee_resolver.resolve(cur, employee_name, mac)
+
+                    if not employee_id:
+                        logger.warning(f"   ⚠️ Employé '{employee_name}' non trouvé en BDD")
+                        results.append({"ssid": employee_name, "mac": mac, "accepted": False, "reason": "Employé inconnu"})
+                        continue
+
+                    rows.append((employee_id, anchor_id, anchor_x, anchor_y, int(rssi), mac, timestamp))
+                    results.append({"ssid": employee_name, "mac": mac, "accepted": True, "employee_id": employee_id})
+                    logger.info(f"   ✅ {employee_name} → {rssi} dBm")
         
-        conn.commit()
+            # ✅ Un seul INSERT multi-lignes pour tout le rapport de l'ancre
+            with STAGE_SECONDS.time("insert"):
+                processed = insert_rssi_measurements(cur, rows)
+                start_rssi_retention()
+
+                conn.commit()
         
-        if processed > 0:
-            calculate_and_broadcast_positions(cur)
-            conn.commit()
-            logger.info(f"   📍 Positions recalculées")
+            # ✅ Conversion RSSI → distance de tout le rapport via la table de l'ancre,
+            # puis alimentation de la fenêtre glissante lue par le moteur de position
+            with STAGE_SECONDS.time("window_add"):
+                distances = rssi_distance_table.convert(cur, anchor_id, [row[4] for row in rows])
+                for row, distance in zip(rows, distances):
+                    rssi_window.add(row[0], anchor_id, anchor_x, anchor_y, row[4], distance, timestamp)
         
-        cur.close()
-        conn.close()
+            anchor_label = anchor_metric_label(anchor_id)
+            RSSI_BADGES.inc(anchor_label, "accepted", amount=processed)
+            RSSI_BADGES.inc(anchor_label, "rejected", amount=len(results) - processed)
+
+            if processed > 0:
+                if position_engine.enabled:
+                    # ✅ Le moteur de position recalcule au prochain tick
+                    position_engine.mark_dirty(row[0] for row in rows)
+                else:
+                    calculate_and_broadcast_positions(cur)
+                    conn.commit()
+                    logger.info(f"   📍 Positions recalculées")
         
-        return jsonify({
-            "success": True, 
-            "message": f"{processed}/{len(badges)} mesures enregistrées",
-            "processed": processed,
-            "anchor_id": anchor_id
-        }), 200
+            cur.close()
         
+            return {
+                "success": True, 
+                "message": f"{processed}/{len(badges)} mesures enregistrées",
+                "processed": processed,
+                "rejected": len(results) - processed,
+                "results": results,
+                "anchor_id": anchor_id
+            }, 200
+        
+    except Exception as e:
+        logger.error(f"❌ process_rssi_report ({source}): {e}", exc_info=True)
+        return {"success": False, "message": str(e)}, 500
+
+@app.route("/api/rssi-data", methods=["POST"])
+def receive_rssi_data_http():
+    """
+    Reçoit les données RSSI via HTTP POST depuis ESP32
+    """
+    response, status = process_rssi_report(request.get_json(silent=True), "HTTP")
+    return jsonify(response), status
+
+if SOCKETIO_AVAILABLE:
+    RSSI_NAMESPACE = "/api/rssi-data"
+
+    @socketio.on("connect", namespace=RSSI_NAMESPACE)
+    def rssi_socket_connect():
+        logger.info(f"🔌 Ancre connectée via Socket.IO ({request.sid})")
+
+    @socketio.on("disconnect", namespace=RSSI_NAMESPACE)
+    def rssi_socket_disconnect(reason=None):
+        logger.info(f"🔌 Ancre déconnectée ({request.sid})")
+
+    @socketio.on("rssi_data", namespace=RSSI_NAMESPACE)
+    def receive_rssi_data_socket(data):
+        """
+        Reçoit les trames `42/api/rssi-data,["rssi_data", {...}]` des ancres.
+        La réponse est renvoyée en acquittement si le client en demande un.
+        """
+        if isinstance(data, str):
+            try:
+                data = json.loads(data)
+            except ValueError:
+                data = None
+        response, _ = process_rssi_report(data, "Socket.IO")
+        if response.get("success"):
+            # Room par ancre (id normalisé) : reçoit les pointage_event qui la concernent
+            join_room(f"anchor-{response['anchor_id']}")
+        return response
+
+# ========== CALIBRATION DES ANCRES ==========
+
+@app.route("/api/anchors/calibration", methods=["GET"])
+def get_anchor_calibration():
+    try:
+        with db_connection() as conn:
+            cur = conn.cursor()
+            cur.execute("""
+                SELECT anchor_id, tx_power, path_loss_exponent, updated_at
+                FROM anchor_calibration
+                ORDER BY anchor_id
+            """)
+            rows = cur.fetchall()
+
+            calibrations = (
+                [dict(row) for row in rows] if DB_DRIVER == "postgres"
+                else [dict(zip([col[0] for col in cur.description], row)) for row in rows]
+            )
+
+            cur.close()
+            return jsonify({
+                "success": True,
+                "calibrations": calibrations,
+                "defaults": {"tx_power": DEFAULT_TX_POWER, "path_loss_exponent": DEFAULT_PATH_LOSS_EXPONENT},
+                "clamp_events": rssi_distance_table.clamp_counts()
+            }), 200
+    except Exception as e:
+        logger.error(f"❌ get_anchor_calibration: {e}")
+        return jsonify({"success": False, "message": str(e)}), 500
+
+@app.route("/api/anchors/<int:anchor_id>/calibration", methods=["PUT"])
+def update_anchor_calibration(anchor_id):
+    data = request.get_json(silent=True)
+    if not data:
+        return jsonify({"success": False, "message": "Requête vide"}), 400
+
+    # Champs absents : valeur enregistrée conservée (ou valeur par défaut si aucune)
+    tx_power = data.get("tx_power")
+    n = data.get("path_loss_exponent")
+    if n is None:
+        n = data.get("n")
+    if tx_power is None and n is None:
+        return jsonify({"success": False, "message": "tx_power ou path_loss_exponent requis"}), 400
+
+    try:
+        tx_power = float(tx_power) if tx_power is not None else None
+        n = float(n) if n is not None else None
+    except (ValueError, TypeError):
+        return jsonify({"success": False, "message": "tx_power et path_loss_exponent doivent être numériques"}), 400
+
+    if n is not None and n <= 0:
+        return jsonify({"success": False, "message": "path_loss_exponent doit être supérieur à 0"}), 400
+
+    try:
+        with db_connection() as conn:
+            cur = conn.cursor()
+            if tx_power is None or n is None:
+                cur.execute(f"""
+                    SELECT tx_power, path_loss_exponent FROM anchor_calibration WHERE anchor_id = {PLACEHOLDER}
+                """, [anchor_id])
+                row = cur.fetchone()
+                stored = (
+                    (DEFAULT_TX_POWER, DEFAULT_PATH_LOSS_EXPONENT) if row is None
+                    else (row[0], row[1]) if DB_DRIVER == "sqlite"
+                    else (row['tx_power'], row['path_loss_exponent'])
+                )
+                tx_power = stored[0] if tx_power is None else tx_power
+                n = stored[1] if n is None else n
+
+            cur.execute(f"""
+                INSERT INTO anchor_calibration (anchor_id, tx_power, path_loss_exponent, updated_at)
+                VALUES ({PLACEHOLDER}, {PLACEHOLDER}, {PLACEHOLDER}, {PLACEHOLDER})
+                ON CONFLICT (anchor_id) DO UPDATE
+                SET tx_power = EXCLUDED.tx_power,
+                    path_loss_exponent = EXCLUDED.path_loss_exponent,
+                    updated_at = EXCLUDED.updated_at
+            """, [anchor_id, tx_power, n, int(datetime.now().timestamp() * 1000)])
+            conn.commit()
+            cur.close()
+            rssi_distance_table.invalidate()
+
+            logger.info(f"✅ Calibration ancre #{anchor_id}: tx_power={tx_power}, n={n}")
+            return jsonify({
+                "success": True,
+                "message": "Calibration enregistrée",
+                "anchor_id": anchor_id,
+                "tx_power": tx_power,
+                "path_loss_exponent": n
+            }), 200
     except Exception as e:
-        logger.error(f"❌ receive_rssi_data_http: {e}", exc_info=True)
+        logger.error(f"❌ update_anchor_calibration: {e}")
         return jsonify({"success": False, "message": str(e)}), 500
 
 # ========== FONCTIONS DE CALCUL OPTIMISÉES ==========
 
+# Solveur du moteur de position : "warm" (linéaire + Gauss-Newton, sans SciPy)
+# ou "lm" (Levenberg-Marquardt vectorisé)
+TRILATERATION_SOLVER = os.getenv("TRILATERATION_SOLVER", "warm")
+
 def rssi_to_distance(rssi, tx_power=-59, n=2.5):
     """
     Convertit un RSSI en distance estimée (mètres).
@@ -543,9 +1411,8 @@ def rssi_to_distance(rssi, tx_power=-59, n=2.5):
     if rssi == 0:
         return -1.0
     
-    # Filtrage des valeurs aberrantes
+    # Filtrage des valeurs aberrantes (comptées par RssiDistanceTable sur le chemin d'ingestion)
     if rssi > -30 or rssi < -100:
-        logger.warning(f"⚠️ RSSI hors limites: {rssi} dBm")
         rssi = max(-100, min(-30, rssi))
     
     ratio = (tx_power - rssi) / (10 * n)
@@ -554,11 +1421,236 @@ def rssi_to_distance(rssi, tx_power=-59, n=2.5):
     # Limite la distance max à 15m pour éviter les valeurs aberrantes
     return round(min(distance, 15.0), 2)
 
-def trilateration_numpy(anchors):
+# Plage RSSI exploitable (dBm) et modèle de propagation par défaut
+RSSI_MIN, RSSI_MAX = -100, -30
+DEFAULT_TX_POWER = -59
+DEFAULT_PATH_LOSS_EXPONENT = 2.5
+
+# Dimensions de la zone suivie (m) : positions bornées à [0, ROOM_WIDTH] × [0, ROOM_HEIGHT]
+ROOM_WIDTH = float(os.getenv("ROOM_WIDTH", "6"))
+ROOM_HEIGHT = float(os.getenv("ROOM_HEIGHT", "5"))
+
+# Bornage à la zone : forme scalaire (solveurs point par point, utilisables sans NumPy)
+# et forme tableau (solveurs vectorisés, tracker de positions)
+def clamp_to_room(x, y):
+    """Position (x, y) bornée à la zone, en float Python (np.float64 refusé par PostgreSQL)."""
+    return float(max(0.0, min(ROOM_WIDTH, x))), float(max(0.0, min(ROOM_HEIGHT, y)))
+
+def clamp_positions_to_room(p):
+    """Borne sur place les colonnes x (0) et y (1) d'un tableau (N, ≥2) ; retourne p."""
+    p[:, 0] = np.clip(p[:, 0], 0.0, ROOM_WIDTH)
+    p[:, 1] = np.clip(p[:, 1], 0.0, ROOM_HEIGHT)
+    return p
+
+def _outside_room(x, y):
+    return not (0.0 <= x <= ROOM_WIDTH and 0.0 <= y <= ROOM_HEIGHT)
+
+def _outside_room_mask(p):
+    """Forme tableau de _outside_room : True pour les lignes que clamp_positions_to_room déplace."""
+    return ~((p[:, 0] >= 0.0) & (p[:, 0] <= ROOM_WIDTH) & (p[:, 1] >= 0.0) & (p[:, 1] <= ROOM_HEIGHT))
+
+class RssiDistanceTable:
+    """
+    Tables RSSI → distance précalculées par ancre (71 entrées de -100 à -30 dBm).
+    La calibration (tx_power, n) est lue dans anchor_calibration et gardée en mémoire ;
+    les RSSI hors plage sont bornés et comptés par ancre au lieu d'être loggés.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calibration = None
+        self._tables = {}
+        self.clamp_events = {}
+
+    def is_calibrated(self, anchor_id):
+        """Ancre présente dans anchor_calibration (d'après le dernier chargement)."""
+        calibration = self._calibration
+        return calibration is not None and anchor_id in calibration
+
+    def clamp_counts(self):
+        """Copie des compteurs de RSSI bornés par ancre (modifiés par l'ingestion)."""
+        with self._lock:
+            return dict(self.clamp_events)
+
+    def invalidate(self):
+        """À appeler après toute écriture sur anchor_calibration."""
+        with self._lock:
+            self._calibration = None
+            self._tables = {}
+
+    def _load(self, cursor):
+        cursor.execute("SELECT anchor_id, tx_power, path_loss_exponent FROM anchor_calibration")
+        calibration = {}
+        for row in cursor.fetchall():
+            anchor_id = row[0] if DB_DRIVER == "sqlite" else row['anchor_id']
+            tx_power = row[1] if DB_DRIVER == "sqlite" else row['tx_power']
+            n = row[2] if DB_DRIVER == "sqlite" else row['path_loss_exponent']
+            calibration[anchor_id] = (tx_power, n)
+        with self._lock:
+            self._calibration = calibration
+        return calibration
+
+    def table(self, cursor, anchor_id):
+        calibration = self._calibration
+        if calibration is None:
+            calibration = self._load(cursor)
+        # Ancres non calibrées : une seule table par défaut (clé None), quel que soit l'id reçu
+        if anchor_id not in calibration:
+            anchor_id = None
+        table = self._tables.get(anchor_id)
+        if table is None:
+            tx_power, n = calibration.get(anchor_id, (DEFAULT_TX_POWER, DEFAULT_PATH_LOSS_EXPONENT))
+            table = [
+                rssi_to_distance(rssi, tx_power, n)
+                for rssi in range(RSSI_MIN, RSSI_MAX + 1)
+            ]
+            if NUMPY_AVAILABLE:
+                table = np.array(table)
+            self._tables[anchor_id] = table
+        return table
+
+    def convert(self, cursor, anchor_id, rssis):
+        """
+        Convertit une liste de RSSI d'une même ancre en distances.
+        RSSI = 0 (mesure invalide) donne -1, comme rssi_to_distance.
+        """
+        table = self.table(cursor, anchor_id)
+
+        if NUMPY_AVAILABLE:
+            values = np.rint(np.asarray(rssis, dtype=float))
+            invalid = values == 0
+            clamped = ((values < RSSI_MIN) | (values > RSSI_MAX)) & ~invalid
+            indexes = np.clip(values, RSSI_MIN, RSSI_MAX).astype(int) - RSSI_MIN
+            distances = np.where(invalid, -1.0, table[indexes])
+            clamp_count = int(np.count_nonzero(clamped))
+            distances = distances.tolist()
+        else:
+            distances = []
+            clamp_count = 0
+            for rssi in rssis:
+                rssi = int(round(rssi))
+                if rssi == 0:
+                    distances.append(-1.0)
+                    continue
+                if rssi < RSSI_MIN or rssi > RSSI_MAX:
+                    clamp_count += 1
+                    rssi = max(RSSI_MIN, min(RSSI_MAX, rssi))
+                distances.append(table[rssi - RSSI_MIN])
+
+        if clamp_count:
+            # Même regroupement que les métriques : les id inconnus comptent sous "unknown"
+            label = anchor_metric_label(anchor_id)
+            with self._lock:
+                self.clamp_events[label] = self.clamp_events.get(label, 0) + clamp_count
+        return distances
+
+
+rssi_distance_table = RssiDistanceTable()
+
+# Profilage des solveurs (désactivé par défaut, activable via /api/admin/solver-stats)
+SOLVER_PROFILING = os.getenv("SOLVER_PROFILING", "0") == "1"
+SOLVER_PROFILE_SIZE = int(os.getenv("SOLVER_PROFILE_SIZE", "1000"))
+
+def _percentile(values, q):
+    if not values:
+        return None
+    values = sorted(values)
+    return values[min(len(values) - 1, int(q / 100 * len(values)))]
+
+class SolverProfiler:
+    """
+    Statistiques de trilatération en mémoire : durée, itérations (nfev),
+    norme des résidus, positions bornées à la zone et raisons de repli.
+    Totaux cumulés par solveur + les SOLVER_PROFILE_SIZE derniers appels.
+    Un appel vectorisé (trilateration_many) compte pour une entrée de `solves` résolutions.
+    """
+
+    def __init__(self, enabled, size):
+        self.enabled = enabled
+        self._lock = threading.Lock()
+        self._recent = deque(maxlen=size)
+        self._totals = {}
+        self.since = time.time()
+
+    def reset(self):
+        with self._lock:
+            self._recent.clear()
+            self._totals = {}
+            self.since = time.time()
+
+    def record(self, solver, seconds, solves=1, nfev=None, residual=None,
+               residual_max=None, clamped=0, degenerate=False, fallback=None):
+        entry = {
+            "solver": solver,
+            "at": int(time.time() * 1000),
+            "seconds": seconds,
+            "solves": solves,
+            "nfev": nfev,
+            "residual": residual,
+            "residual_max": residual if residual_max is None else residual_max,
+            "clamped": clamped,
+            "degenerate": degenerate,
+            "fallback": fallback,
+        }
+        with self._lock:
+            self._recent.append(entry)
+            totals = self._totals.setdefault(solver, {
+                "calls": 0, "solves": 0, "seconds": 0.0, "nfev": 0,
+                "clamped": 0, "degenerate": 0, "fallbacks": {}
+            })
+            totals["calls"] += 1
+            totals["solves"] += solves
+            totals["seconds"] += seconds
+            totals["nfev"] += nfev or 0
+            totals["clamped"] += clamped
+            totals["degenerate"] += int(degenerate)
+            if fallback:
+                # Clé = type d'exception, pour garder un nombre de clés borné
+                reason = fallback.split(":", 1)[0]
+                totals["fallbacks"][reason] = totals["fallbacks"].get(reason, 0) + 1
+
+    def snapshot(self, recent=0):
+        with self._lock:
+            entries = list(self._recent)
+            totals = {solver: dict(t, fallbacks=dict(t["fallbacks"])) for solver, t in self._totals.items()}
+
+        solvers = {}
+        for solver, t in totals.items():
+            window = [e for e in entries if e["solver"] == solver]
+            per_solve_ms = [e["seconds"] * 1000 / e["solves"] for e in window if e["solves"]]
+            residuals = [e["residual"] for e in window if e["residual"] is not None]
+            nfevs = [e["nfev"] for e in window if e["nfev"] is not None]
+            solvers[solver] = dict(
+                t,
+                seconds=round(t["seconds"], 6),
+                clamp_rate=round(t["clamped"] / t["solves"], 4) if t["solves"] else None,
+                # Percentiles sur les derniers appels uniquement
+                window_calls=len(window),
+                solve_ms={f"p{q}": _percentile(per_solve_ms, q) for q in (50, 95, 99)},
+                nfev={f"p{q}": _percentile(nfevs, q) for q in (50, 95, 99)},
+                residual={f"p{q}": _percentile(residuals, q) for q in (50, 95, 99)},
+            )
+
+        return {
+            "enabled": self.enabled,
+            "since": int(self.since * 1000),
+            "capacity": self._recent.maxlen,
+            "solvers": solvers,
+            "recent": entries[-recent:] if recent > 0 else [],
+        }
+
+
+solver_profiler = SolverProfiler(SOLVER_PROFILING, SOLVER_PROFILE_SIZE)
+
+def trilateration_numpy(anchors, stats=None):
     """
     Trilatération optimisée avec NumPy/SciPy (moindres carrés non linéaires).
     Résout le système: min Σ((x - xi)² + (y - yi)² - ri²)²
+    Si stats (dict) est fourni, y renseigne nfev, residual et clamped.
     """
+    # Import local : SciPy n'est chargé qu'au premier appel
+    from scipy.optimize import least_squares
+
     if len(anchors) < 3:
         return (anchors[0]['x'], anchors[0]['y'])
     
@@ -586,17 +1678,21 @@ def trilateration_numpy(anchors):
     )
     
     x, y = result.x
-    
-    # Limiter aux dimensions de la zone (0-6m × 0-5m)
-    x = max(0.0, min(6.0, x))
-    y = max(0.0, min(5.0, y))
-    
-    # ✅ IMPORTANT: Convertir np.float64 en float Python pour PostgreSQL
-    return round(float(x), 2), round(float(y), 2)
 
-def trilateration_basic(anchors):
+    if stats is not None:
+        stats["nfev"] = int(result.nfev)
+        stats["residual"] = float(np.linalg.norm(result.fun))
+        stats["clamped"] = int(_outside_room(x, y))
+
+    # Limiter aux dimensions de la zone (ROOM_WIDTH × ROOM_HEIGHT)
+    # ✅ IMPORTANT: clamp_to_room convertit np.float64 en float Python pour PostgreSQL
+    x, y = clamp_to_room(x, y)
+    return round(x, 2), round(y, 2)
+
+def trilateration_basic(anchors, stats=None):
     """
     Trilatération géométrique classique (fallback si NumPy indisponible).
+    Si stats (dict) est fourni, y renseigne residual, clamped et degenerate.
     """
     anchors = sorted(anchors, key=lambda x: x['distance'])[:3]
 
@@ -614,198 +1710,854 @@ def trilateration_basic(anchors):
 
     denom = (A*E - B*D)
     if abs(denom) < 1e-6:  # Éviter division par zéro
+        if stats is not None:
+            stats["degenerate"] = True
         return (x1, y1)
 
     x = (C*E - B*F) / denom
     y = (A*F - C*D) / denom
-    
+
+    if stats is not None:
+        stats["residual"] = math.sqrt(sum(
+            (math.hypot(x - xi, y - yi) - ri)**2
+            for xi, yi, ri in ((x1, y1, r1), (x2, y2, r2), (x3, y3, r3))
+        ))
+        stats["clamped"] = int(_outside_room(x, y))
+
     # Limiter aux dimensions de la zone
-    x = max(0.0, min(6.0, x))
-    y = max(0.0, min(5.0, y))
-    
+    x, y = clamp_to_room(x, y)
     return round(x, 2), round(y, 2)
 
 def trilateration(anchors):
     """
     Point d'entrée principal pour la trilatération.
     Utilise NumPy si disponible, sinon méthode géométrique.
+    Chaque résolution est enregistrée dans solver_profiler s'il est activé.
     """
+    stats = {} if solver_profiler.enabled else None
+    started = time.perf_counter()
+    solver = "basic"
+
     if NUMPY_AVAILABLE:
         try:
-            return trilateration_numpy(anchors)
+            result = trilateration_numpy(anchors, stats)
+            solver = "numpy"
         except Exception as e:
             logger.warning(f"⚠️ Échec trilatération NumPy: {e}, utilisation méthode basique")
-            return trilateration_basic(anchors)
+            if stats is not None:
+                stats = {"fallback": f"{type(e).__name__}: {e}"[:200]}
+            result = trilateration_basic(anchors, stats)
     else:
-        return trilateration_basic(anchors)
+        result = trilateration_basic(anchors, stats)
+
+    if stats is not None:
+        solver_profiler.record(solver, time.perf_counter() - started, **stats)
+    return result
+
+def trilateration_batch(positions, distances, mask, max_iter=30, stats=None):
+    """
+    Trilatération vectorisée de plusieurs employés en une seule passe NumPy.
+    Levenberg-Marquardt 2D appliqué en parallèle à tous les employés.
+
+    Args:
+        positions: tableau (E, K, 2) des positions d'ancres, complété par des zéros
+        distances: tableau (E, K) des distances estimées
+        mask: tableau booléen (E, K), False pour les ancres de remplissage
+        max_iter: nombre maximal d'itérations LM
+        stats: dict optionnel, renseigné avec itérations, résidus et positions bornées
+    Returns:
+        tableau (E, 2) des positions, bornées à la zone (ROOM_WIDTH × ROOM_HEIGHT)
+    """
+    positions = np.asarray(positions, dtype=float)
+    distances = np.asarray(distances, dtype=float)
+    weights_mask = np.asarray(mask, dtype=float)
+
+    def residuals(p):
+        diff = p[:, None, :] - positions
+        dist = np.maximum(np.sqrt(np.sum(diff**2, axis=2)), 1e-9)
+        return diff, dist, (dist - distances) * weights_mask
+
+    # Point initial = centroïde pondéré par inverse des distances (comme trilateration_numpy)
+    weights = weights_mask / (distances + 0.1)
+    p = np.sum(positions * weights[:, :, None], axis=1) / np.sum(weights, axis=1)[:, None]
+
+    _, _, r = residuals(p)
+    cost = np.sum(r**2, axis=1)
+    lam = np.full(len(p), 1e-3)
+
+    iterations = 0
+    for iterations in range(1, max_iter + 1):
+        diff, dist, r = residuals(p)
+        J = diff / dist[:, :, None] * weights_mask[:, :, None]
+
+        # Équations normales 2×2 par employé : (JᵀJ + λ·diag(JᵀJ)) δ = -Jᵀr
+        a = np.sum(J[:, :, 0]**2, axis=1) * (1 + lam) + 1e-12
+        b = np.sum(J[:, :, 0] * J[:, :, 1], axis=1)
+        c = np.sum(J[:, :, 1]**2, axis=1) * (1 + lam) + 1e-12
+        g0 = np.sum(J[:, :, 0] * r, axis=1)
+        g1 = np.sum(J[:, :, 1] * r, axis=1)
+
+        det = a * c - b * b
+        det = np.where(np.abs(det) < 1e-12, np.inf, det)
+        step = np.stack([-(c * g0 - b * g1) / det, -(a * g1 - b * g0) / det], axis=1)
+
+        p_new = p + step
+        _, _, r_new = residuals(p_new)
+        cost_new = np.sum(r_new**2, axis=1)
+
+        improved = cost_new < cost
+        p = np.where(improved[:, None], p_new, p)
+        cost = np.where(improved, cost_new, cost)
+        lam = np.where(improved, lam * 0.3, lam * 10.0)
+
+        if np.all(np.abs(step) < 1e-6):
+            break
+
+    if stats is not None:
+        record_batch_stats(stats, p, np.sqrt(cost), iterations)
+
+    # Limiter aux dimensions de la zone (ROOM_WIDTH × ROOM_HEIGHT)
+    return np.round(clamp_positions_to_room(p), 2)
+
+def multilateration_linear_batch(positions, distances, mask):
+    """
+    Solution fermée linéarisée pour un nombre quelconque d'ancres (≥ 3).
+    Chaque ancre donne : -2·xi·x - 2·yi·y + R = ri² - xi² - yi², avec R = x² + y²,
+    résolu par moindres carrés sur (x, y, R), pour tous les employés à la fois.
+    Mêmes tableaux (E, K) que trilateration_batch. Retourne (E, 2).
+    """
+    m = np.asarray(mask, dtype=float)
+    A = np.stack([-2 * positions[:, :, 0], -2 * positions[:, :, 1], np.ones_like(distances)], axis=2)
+    A = A * m[:, :, None]
+    b = (distances**2 - positions[:, :, 0]**2 - positions[:, :, 1]**2) * m
+
+    AtA = np.einsum('eki,ekj->eij', A, A) + 1e-9 * np.eye(3)
+    Atb = np.einsum('eki,ek->ei', A, b)
+    return np.linalg.solve(AtA, Atb[:, :, None])[:, :2, 0]
+
+def trilateration_warm_batch(positions, distances, mask, previous=None, steps=5, stats=None):
+    """
+    Solveur rapide sans SciPy : point de départ = meilleure des deux estimations
+    entre la solution linéarisée et la position précédente (warm start),
+    puis quelques itérations de Gauss-Newton à nombre fixe.
+
+    Args:
+        previous: tableau (E, 2) des positions précédentes, NaN si inconnues
+        steps: nombre d'itérations de Gauss-Newton
+        stats: dict optionnel, renseigné comme pour trilateration_batch
+    Returns:
+        tableau (E, 2) des positions, bornées à la zone (ROOM_WIDTH × ROOM_HEIGHT)
+    """
+    positions = np.asarray(positions, dtype=float)
+    distances = np.asarray(distances, dtype=float)
+    m = np.asarray(mask, dtype=float)
+
+    def cost(p):
+        dist = np.sqrt(np.sum((p[:, None, :] - positions)**2, axis=2))
+        return np.sum(((dist - distances) * m)**2, axis=1)
+
+    p = clamp_positions_to_room(multilateration_linear_batch(positions, distances, mask))
+
+    if previous is not None:
+        previous = np.asarray(previous, dtype=float)
+        known = ~np.isnan(previous).any(axis=1)
+        warm = np.where(known[:, None], previous, p)
+        p = np.where((cost(warm) < cost(p))[:, None], warm, p)
+
+    for _ in range(steps):
+        diff = p[:, None, :] - positions
+        dist = np.maximum(np.sqrt(np.sum(diff**2, axis=2)), 1e-9)
+        r = (dist - distances) * m
+        J = diff / dist[:, :, None] * m[:, :, None]
+
+        a = np.sum(J[:, :, 0]**2, axis=1) + 1e-9
+        b = np.sum(J[:, :, 0] * J[:, :, 1], axis=1)
+        c = np.sum(J[:, :, 1]**2, axis=1) + 1e-9
+        g0 = np.sum(J[:, :, 0] * r, axis=1)
+        g1 = np.sum(J[:, :, 1] * r, axis=1)
+
+        det = a * c - b * b
+        det = np.where(np.abs(det) < 1e-12, np.inf, det)
+        p = p + np.stack([-(c * g0 - b * g1) / det, -(a * g1 - b * g0) / det], axis=1)
+
+    if stats is not None:
+        record_batch_stats(stats, p, np.sqrt(cost(p)), steps)
+
+    # Limiter aux dimensions de la zone (ROOM_WIDTH × ROOM_HEIGHT)
+    return np.round(clamp_positions_to_room(p), 2)
+
+def record_batch_stats(stats, p, residuals, iterations):
+    """Résumé d'une résolution vectorisée (avant bornage) pour solver_profiler."""
+    outside = _outside_room_mask(p)
+    stats["nfev"] = int(iterations)
+    stats["residual"] = float(np.mean(residuals))
+    stats["residual_max"] = float(np.max(residuals))
+    stats["clamped"] = int(np.count_nonzero(outside))
+
+def pack_anchors(anchor_lists):
+    """
+    Empile des listes d'ancres de tailles variables en tableaux (E, K) complétés,
+    avec le masque des ancres réelles, pour trilateration_batch.
+    """
+    width = max(len(anchors) for anchors in anchor_lists)
+    positions = np.zeros((len(anchor_lists), width, 2))
+    distances = np.zeros((len(anchor_lists), width))
+    mask = np.zeros((len(anchor_lists), width), dtype=bool)
+
+    for i, anchors in enumerate(anchor_lists):
+        for j, anchor in enumerate(anchors):
+            positions[i, j] = (anchor['x'], anchor['y'])
+            distances[i, j] = anchor['distance']
+            mask[i, j] = True
+
+    return positions, distances, mask
 
-def calculate_and_broadcast_positions(cursor):
+def trilateration_many(anchor_lists, previous=None):
+    """
+    Trilatération de plusieurs employés à la fois.
+    Un seul appel vectorisé si NumPy est disponible, sinon un appel par employé.
+    previous : positions précédentes (x, y) ou None, utilisées par le solveur "warm".
+    Retourne une liste de (x, y) dans l'ordre des listes d'ancres.
+    """
+    if not anchor_lists:
+        return []
+    if NUMPY_AVAILABLE:
+        stats = {} if solver_profiler.enabled else None
+        solver = f"{TRILATERATION_SOLVER}_batch"
+        started = time.perf_counter()
+        try:
+            packed = pack_anchors(anchor_lists)
+            if TRILATERATION_SOLVER == "warm":
+                prev = None
+                if previous is not None:
+                    prev = np.array([p if p is not None else (np.nan, np.nan) for p in previous], dtype=float)
+                solved = trilateration_warm_batch(*packed, previous=prev, stats=stats)
+            else:
+                solved = trilateration_batch(*packed, stats=stats)
+            # ✅ Convertir np.float64 en float Python pour PostgreSQL
+            positions = [(float(x), float(y)) for x, y in solved]
+            if stats is not None:
+                solver_profiler.record(solver, time.perf_counter() - started, solves=len(positions), **stats)
+            return positions
+        except Exception as e:
+            logger.warning(f"⚠️ Échec trilatération vectorisée: {e}, calcul employé par employé")
+            if stats is not None:
+                solver_profiler.record(
+                    solver, time.perf_counter() - started, solves=0,
+                    fallback=f"{type(e).__name__}: {e}"[:200]
+                )
+    return [trilateration(anchors) for anchors in anchor_lists]
+
+# ========== FENÊTRE GLISSANTE RSSI EN MÉMOIRE ==========
+
+# Durée de la fenêtre de moyennage et nombre max d'échantillons par (employé, ancre)
+RSSI_WINDOW_SECONDS = float(os.getenv("RSSI_WINDOW_SECONDS", "8"))
+RSSI_WINDOW_CAPACITY = int(os.getenv("RSSI_WINDOW_CAPACITY", "32"))
+
+class AnchorRingBuffer:
+    """
+    Tampon circulaire de taille fixe des mesures d'un badge vues par une ancre.
+    Les sommes courantes donnent les moyennes RSSI/distance en O(1).
+    """
+
+    __slots__ = ("x", "y", "timestamps", "rssis", "distances",
+                 "head", "count", "sum_rssi", "sum_distance")
+
+    def __init__(self, capacity, x, y):
+        self.x = x
+        self.y = y
+        self.timestamps = [0] * capacity
+        self.rssis = [0] * capacity
+        self.distances = [0.0] * capacity
+        self.head = 0
+        self.count = 0
+        self.sum_rssi = 0
+        self.sum_distance = 0.0
+
+    def _pop_oldest(self):
+        self.sum_rssi -= self.rssis[self.head]
+        self.sum_distance -= self.distances[self.head]
+        self.head = (self.head + 1) % len(self.timestamps)
+        self.count -= 1
+        if self.count == 0:
+            # Remise à zéro pour éviter la dérive des flottants
+            self.sum_rssi = 0
+            self.sum_distance = 0.0
+
+    def push(self, timestamp, rssi, distance):
+        capacity = len(self.timestamps)
+        if self.count == capacity:
+            self._pop_oldest()
+        i = (self.head + self.count) % capacity
+        self.timestamps[i] = timestamp
+        self.rssis[i] = rssi
+        self.distances[i] = distance
+        self.sum_rssi += rssi
+        self.sum_distance += distance
+        self.count += 1
+
+    def evict(self, threshold):
+        """Retire les échantillons dont le timestamp est <= threshold."""
+        while self.count and self.timestamps[self.head] <= threshold:
+            self._pop_oldest()
+
+class RssiWindow:
+    """
+    Fenêtre glissante en mémoire des mesures RSSI, indexée par (employee_id, anchor_id).
+    Le moteur de position lit ici ; la table rssi_measurements ne sert plus
+    qu'à l'historique durable.
+    """
+
+    def __init__(self, window_seconds, capacity):
+        self.window_ms = int(window_seconds * 1000)
+        self.capacity = capacity
+        self._buffers = {}
+        self._lock = threading.Lock()
+
+    def add(self, employee_id, anchor_id, anchor_x, anchor_y, rssi, distance, timestamp):
+        if distance <= 0:
+            return
+        with self._lock:
+            anchors = self._buffers.setdefault(employee_id, {})
+            buffer = anchors.get(anchor_id)
+            if buffer is None:
+                buffer = anchors[anchor_id] = AnchorRingBuffer(self.capacity, anchor_x, anchor_y)
+            else:
+                buffer.x, buffer.y = anchor_x, anchor_y
+            buffer.push(timestamp, rssi, distance)
+
+    def averages(self, employee_id, now_ms):
+        """Retourne les moyennes par ancre encore dans la fenêtre pour cet employé."""
+        threshold = now_ms - self.window_ms
+        averaged = []
+        with self._lock:
+            anchors = self._buffers.get(employee_id)
+            if not anchors:
+                return averaged
+            for anchor_id in list(anchors):
+                buffer = anchors[anchor_id]
+                buffer.evict(threshold)
+                if not buffer.count:
+                    del anchors[anchor_id]
+                    continue
+                averaged.append({
+                    'anchor_id': anchor_id,
+                    'x': buffer.x,
+                    'y': buffer.y,
+                    'distance': buffer.sum_distance / buffer.count,
+                    'rssi': buffer.sum_rssi / buffer.count
+                })
+            if not anchors:
+                del self._buffers[employee_id]
+        return averaged
+
+    def employee_ids(self):
+        with self._lock:
+            return list(self._buffers)
+
+    def discard(self, employee_id):
+        with self._lock:
+            self._buffers.pop(employee_id, None)
+
+
+rssi_window = RssiWindow(RSSI_WINDOW_SECONDS, RSSI_WINDOW_CAPACITY)
+
+# ========== SUIVI DE POSITION (FILTRE DE KALMAN) ==========
+
+# Qualité du signal → (seuil de mouvement publié en m, écart-type de mesure en m)
+SIGNAL_PROFILES = {
+    "excellent": (0.05, 0.3),  # très précis, filtre plus réactif
+    "good": (0.10, 0.5),       # bon équilibre
+    "weak": (0.20, 1.0),       # plus stable
+}
+# Densité spectrale du bruit d'accélération du modèle à vitesse constante ((m/s²)²)
+TRACKER_PROCESS_NOISE = float(os.getenv("TRACKER_PROCESS_NOISE", "0.5"))
+# Sans mouvement significatif, la position est tout de même persistée à cet intervalle (s)
+TRACKER_PERSIST_SECONDS = float(os.getenv("TRACKER_PERSIST_SECONDS", "5"))
+# Au-delà de ce silence (s), l'état de l'employé est réinitialisé sur la mesure
+TRACKER_RESET_SECONDS = float(os.getenv("TRACKER_RESET_SECONDS", "30"))
+
+def classify_signal(avg_rssi):
+    """Classe la qualité moyenne du signal : excellent / good / weak."""
+    if avg_rssi > -60:
+        return "excellent"
+    if avg_rssi > -70:
+        return "good"
+    return "weak"
+
+class PositionTracker:
+    """
+    Filtre de Kalman à vitesse constante (x, y, vx, vy) par employé, tenu en mémoire.
+    Tous les employés d'un tick sont prédits et corrigés en un seul passage NumPy ;
+    le bruit de mesure suit la qualité du signal (SIGNAL_PROFILES).
+    Garde aussi la dernière position persistée pour décider des écritures en base.
+    Sans NumPy, la mesure est utilisée telle quelle.
+    """
+
+    def __init__(self, process_noise, persist_seconds):
+        self.process_noise = process_noise
+        self.persist_ms = int(persist_seconds * 1000)
+        self._lock = threading.Lock()
+        self._index = {}
+        self._ids = []
+        self._persisted = {}
+        self._last = {}
+        # Tableaux NumPy créés au premier update (NumPy peut être chargé à la demande)
+        self._state = self._cov = self._time = None
+
+    def position(self, employee_id):
+        """Dernière estimation (x, y) de l'employé, ou None."""
+        return self._last.get(employee_id)
+
+    def _add_rows(self, employee_ids):
+        for employee_id in employee_ids:
+            self._index[employee_id] = len(self._ids)
+            self._ids.append(employee_id)
+        count = len(employee_ids)
+        if self._state is None:
+            self._state = np.zeros((0, 4))
+            self._cov = np.zeros((0, 4, 4))
+            self._time = np.zeros(0)
+        self._state = np.concatenate([self._state, np.zeros((count, 4))])
+        self._cov = np.concatenate([self._cov, np.tile(np.eye(4), (count, 1, 1))])
+        self._time = np.concatenate([self._time, np.zeros(count)])
+
+    def update(self, employee_ids, measurements, sigmas, now_ms):
+        """
+        Intègre les positions trilatérées d'un tick.
+        Retourne la liste des positions filtrées (x, y), dans l'ordre de employee_ids.
+        """
+        if not employee_ids:
+            return []
+        if not NUMPY_AVAILABLE:
+            estimates = [(float(x), float(y)) for x, y in measurements]
+            self._last.update(zip(employee_ids, estimates))
+            return estimates
+
+        with self._lock:
+            self._add_rows([e for e in dict.fromkeys(employee_ids) if e not in self._index])
+            rows = np.array([self._index[e] for e in employee_ids])
+            z = np.asarray(measurements, dtype=float)
+            r = np.asarray(sigmas, dtype=float)**2
+
+            x = self._state[rows]
+            P = self._cov[rows]
+            dt = (now_ms - self._time[rows]) / 1000.0
+
+            # Nouveaux employés ou silence prolongé : initialisation sur la mesure
+            reset = (self._time[rows] == 0) | (dt > TRACKER_RESET_SECONDS)
+            x[reset] = np.column_stack([z[reset], np.zeros((reset.sum(), 2))])
+            P[reset] = 0
+            P[reset, 0, 0] = P[reset, 1, 1] = r[reset]
+            P[reset, 2, 2] = P[reset, 3, 3] = 1.0
+
+            track = ~reset
+            if track.any():
+                dt_t = dt[track]
+                n = len(dt_t)
+
+                # Prédiction : x = F·x, P = F·P·Fᵀ + Q
+                F = np.tile(np.eye(4), (n, 1, 1))
+                F[:, 0, 2] = F[:, 1, 3] = dt_t
+                Q = np.zeros((n, 4, 4))
+                q = self.process_noise
+                Q[:, 0, 0] = Q[:, 1, 1] = q * dt_t**4 / 4
+                Q[:, 0, 2] = Q[:, 2, 0] = Q[:, 1, 3] = Q[:, 3, 1] = q * dt_t**3 / 2
+                Q[:, 2, 2] = Q[:, 3, 3] = q * dt_t**2
+
+                xt = np.einsum('nij,nj->ni', F, x[track])
+                Pt = F @ P[track] @ F.transpose(0, 2, 1) + Q
+
+                # Correction avec la position mesurée (H sélectionne x, y)
+                S = Pt[:, :2, :2] + r[track][:, None, None] * np.eye(2)
+                K = Pt[:, :, :2] @ np.linalg.inv(S)
+                xt = xt + np.einsum('nij,nj->ni', K, z[track] - xt[:, :2])
+                Pt = Pt - K @ Pt[:, :2, :]
+
+                x[track] = xt
+                P[track] = Pt
+
+            # Limiter aux dimensions de la zone (ROOM_WIDTH × ROOM_HEIGHT)
+            clamp_positions_to_room(x)
+
+            self._state[rows] = x
+            self._cov[rows] = P
+            self._time[rows] = now_ms
+
+        estimates = [(round(float(px), 2), round(float(py), 2)) for px, py in x[:, :2]]
+        self._last.update(zip(employee_ids, estimates))
+        return estimates
+
+    def should_persist(self, employee_id, x, y, movement_threshold, now_ms):
+        """
+        Retourne (à_persister, distance depuis la dernière écriture).
+        Écriture si mouvement significatif, première position, ou rafraîchissement périodique.
+        """
+        persisted = self._persisted.get(employee_id)
+        if persisted is None:
+            return True, None
+        old_x, old_y, persisted_at = persisted
+        moved = math.hypot(x - old_x, y - old_y)
+        return moved >= movement_threshold or now_ms - persisted_at >= self.persist_ms, moved
+
+    def mark_persisted(self, employee_id, x, y, now_ms):
+        self._persisted[employee_id] = (x, y, now_ms)
+
+    def discard(self, employee_id):
+        with self._lock:
+            self._persisted.pop(employee_id, None)
+            self._last.pop(employee_id, None)
+            row = self._index.pop(employee_id, None)
+            if row is None or not NUMPY_AVAILABLE:
+                return
+            keep = np.arange(len(self._ids)) != row
+            self._ids.pop(row)
+            self._state = self._state[keep]
+            self._cov = self._cov[keep]
+            self._time = self._time[keep]
+            self._index = {e: i for i, e in enumerate(self._ids)}
+
+
+position_tracker = PositionTracker(TRACKER_PROCESS_NOISE, TRACKER_PERSIST_SECONDS)
+
+def calculate_and_broadcast_positions(cursor, employee_ids=None):
     """
     Calcule la position de chaque employé actif via trilatération optimisée.
-    Applique un filtre de lissage exponentiel pour stabiliser les positions.
+    Stabilise les positions avec un filtre de Kalman en mémoire (position_tracker).
     NOUVEAU: Seuil adaptatif selon qualité du signal RSSI.
+    Les mesures proviennent de la fenêtre glissante en mémoire (rssi_window).
+    Si employee_ids est fourni, seuls ces employés sont recalculés.
+    Les positions mises à jour sont diffusées aux tableaux de bord via Socket.IO.
     """
-    # ✅ Fenêtre élargie à 8 secondes pour plus de stabilité
-    threshold = int((datetime.now().timestamp() - 8) * 1000)
+    now_ms = int(datetime.now().timestamp() * 1000)
 
-    cursor.execute(f"""
-        SELECT employee_id, anchor_id, anchor_x, anchor_y, rssi
-        FROM rssi_measurements
-        WHERE timestamp > {PLACEHOLDER}
-    """, (threshold,))
+    if employee_ids is None:
+        employee_ids = rssi_window.employee_ids()
 
-    measurements = cursor.fetchall()
-
-    if not measurements:
+    if not employee_ids:
         logger.info("   ℹ️ Aucune mesure récente pour triangulation")
         return
 
-    employee_data = defaultdict(list)
-    
-    for row in measurements:
-        emp_id = row[0] if DB_DRIVER == "sqlite" else row['employee_id']
-        anchor_id = row[1] if DB_DRIVER == "sqlite" else row['anchor_id']
-        anchor_x = row[2] if DB_DRIVER == "sqlite" else row['anchor_x']
-        anchor_y = row[3] if DB_DRIVER == "sqlite" else row['anchor_y']
-        rssi = row[4] if DB_DRIVER == "sqlite" else row['rssi']
-
-        distance = rssi_to_distance(rssi)
-        
-        if distance > 0:
-            employee_data[emp_id].append({
-                'anchor_id': anchor_id,
-                'x': anchor_x,
-                'y': anchor_y,
-                'distance': distance,
-                'rssi': rssi
-            })
+    candidates = []
+    updates = []
+
+    with STAGE_SECONDS.time("window_query"):
+        for emp_id in employee_ids:
+            # ✅ Moyennes par ancre sur la fenêtre glissante (O(1) par ancre)
+            averaged_anchors = rssi_window.averages(emp_id, now_ms)
 
-    for emp_id, anchors in employee_data.items():
-        if len(anchors) >= 3:
-            # ✅ Moyenner les mesures par ancre pour réduire le bruit
-            anchor_averages = defaultdict(lambda: {'x': 0, 'y': 0, 'distances': [], 'rssis': [], 'count': 0})
-            
-            for anchor in anchors:
-                aid = anchor['anchor_id']
-                anchor_averages[aid]['x'] = anchor['x']
-                anchor_averages[aid]['y'] = anchor['y']
-                anchor_averages[aid]['distances'].append(anchor['distance'])
-                anchor_averages[aid]['rssis'].append(anchor['rssi'])
-                anchor_averages[aid]['count'] += 1
-            
-            # Calculer distance moyenne par ancre
-            averaged_anchors = []
-            all_rssis = []
-            
-            for aid, data in anchor_averages.items():
-                avg_distance = sum(data['distances']) / len(data['distances'])
-                avg_rssi = sum(data['rssis']) / len(data['rssis'])
-                
-                averaged_anchors.append({
-                    'anchor_id': aid,
-                    'x': data['x'],
-                    'y': data['y'],
-                    'distance': avg_distance,
-                    'rssi': avg_rssi
-                })
-                all_rssis.append(avg_rssi)
-            
             if len(averaged_anchors) < 3:
-                logger.info(f"   ⚠️ Employé {emp_id}: seulement {len(averaged_anchors)} ancres après moyennage")
+                logger.info(f"   ⚠️ Employé {emp_id}: seulement {len(averaged_anchors)} ancres (min 3 requis)")
                 continue
-            
-            # ✅ NOUVEAU: Calculer qualité moyenne des signaux
-            avg_rssi = sum(all_rssis) / len(all_rssis)
-            
-            # Classifier la qualité du signal
-            if avg_rssi > -60:
-                signal_quality = "excellent"
-                movement_threshold = 0.05  # 5cm - très précis
-                alpha = 0.20  # Plus réactif
-            elif avg_rssi > -70:
-                signal_quality = "good"
-                movement_threshold = 0.10  # 10cm - bon équilibre
-                alpha = 0.15  # Équilibré
-            else:
-                signal_quality = "weak"
-                movement_threshold = 0.20  # 20cm - plus stable
-                alpha = 0.10  # Très stable
-            
-            # Calculer nouvelle position
-            new_x, new_y = trilateration(averaged_anchors)
-            
-            # Récupérer ancienne position pour lissage
-            cursor.execute(f"""
-                SELECT last_position_x, last_position_y 
-                FROM employees 
-                WHERE id = {PLACEHOLDER}
-            """, (emp_id,))
-            
-            old_pos = cursor.fetchone()
-            
-            if old_pos:
-                if DB_DRIVER == "sqlite":
-                    old_x = old_pos[0]
-                    old_y = old_pos[1]
-                else:
-                    old_x = old_pos['last_position_x']
-                    old_y = old_pos['last_position_y']
-                
-                if old_x is not None and old_y is not None:
-                    # ✅ Filtre adaptatif selon qualité signal
-                    pos_x = round(alpha * new_x + (1 - alpha) * old_x, 2)
-                    pos_y = round(alpha * new_y + (1 - alpha) * old_y, 2)
-                    
-                    # ✅ Seuil de mise à jour adaptatif
-                    distance_moved = ((pos_x - old_x)**2 + (pos_y - old_y)**2)**0.5
-                    
-                    if distance_moved < movement_threshold:
-                        logger.info(
-                            f"   🔒 Employé {emp_id}: mouvement négligeable "
-                            f"({distance_moved:.2f}m < {movement_threshold}m), "
-                            f"signal={signal_quality} ({avg_rssi:.0f}dBm), position maintenue"
-                        )
-                        continue  # Ne pas mettre à jour
-                    
-                    # Conversion pour PostgreSQL
-                    pos_x = float(pos_x)
-                    pos_y = float(pos_y)
-                    
-                    logger.info(
-                        f"   📍 Position employé {emp_id}: ({pos_x:.2f}, {pos_y:.2f}) "
-                        f"[mouvement={distance_moved:.2f}m, signal={signal_quality}, "
-                        f"RSSI={avg_rssi:.0f}dBm, alpha={alpha}]"
-                    )
-                else:
-                    pos_x, pos_y = float(new_x), float(new_y)
-                    logger.info(f"   📍 Position initiale employé {emp_id}: ({pos_x:.2f}, {pos_y:.2f})")
-            else:
-                pos_x, pos_y = float(new_x), float(new_y)
-                logger.info(f"   📍 Première position employé {emp_id}: ({pos_x:.2f}, {pos_y:.2f})")
 
-            cursor.execute(f"""
-                UPDATE employees
-                SET last_position_x = {PLACEHOLDER}, last_position_y = {PLACEHOLDER}, last_seen = {PLACEHOLDER}
-                WHERE id = {PLACEHOLDER}
-            """, [pos_x, pos_y, int(datetime.now().timestamp() * 1000), emp_id])
+            candidates.append((emp_id, averaged_anchors))
+
+    # ✅ Une seule résolution vectorisée pour tous les employés
+    with STAGE_SECONDS.time("solve"):
+        solved = trilateration_many(
+            [anchors for _, anchors in candidates],
+            [position_tracker.position(emp_id) for emp_id, _ in candidates]
+        )
+
+    # ✅ Qualité moyenne des signaux → bruit de mesure et seuil de mouvement
+    qualities = []
+    for _, averaged_anchors in candidates:
+        avg_rssi = sum(anchor['rssi'] for anchor in averaged_anchors) / len(averaged_anchors)
+        qualities.append((classify_signal(avg_rssi), avg_rssi))
+
+    # ✅ Filtre de Kalman vectorisé sur tous les employés du tick
+    with STAGE_SECONDS.time("filter"):
+        estimates = position_tracker.update(
+            [emp_id for emp_id, _ in candidates],
+            solved,
+            [SIGNAL_PROFILES[quality][1] for quality, _ in qualities],
+            now_ms
+        )
 
+    for (emp_id, _), (pos_x, pos_y), (signal_quality, avg_rssi) in zip(candidates, estimates, qualities):
+        movement_threshold = SIGNAL_PROFILES[signal_quality][0]
+        persist, distance_moved = position_tracker.should_persist(
+            emp_id, pos_x, pos_y, movement_threshold, now_ms
+        )
+
+        if not persist:
+            logger.info(
+                f"   🔒 Employé {emp_id}: mouvement négligeable "
+                f"({distance_moved:.2f}m < {movement_threshold}m), "
+                f"signal={signal_quality} ({avg_rssi:.0f}dBm), position maintenue"
+            )
+            continue  # Ne pas mettre à jour
+
+        if distance_moved is None:
+            logger.info(f"   📍 Première position employé {emp_id}: ({pos_x:.2f}, {pos_y:.2f})")
         else:
-            logger.info(f"   ⚠️ Employé {emp_id}: seulement {len(anchors)} ancres (min 3 requis)")
-# ========== AUTRES ROUTES ==========
+            logger.info(
+                f"   📍 Position employé {emp_id}: ({pos_x:.2f}, {pos_y:.2f}) "
+                f"[mouvement={distance_moved:.2f}m, signal={signal_quality}, "
+                f"RSSI={avg_rssi:.0f}dBm]"
+            )
+
+        updates.append({"id": emp_id, "x": pos_x, "y": pos_y, "last_seen": now_ms})
+
+    # ✅ Écriture groupée : une seule instruction pour toute la passe
+    with STAGE_SECONDS.time("write_back"):
+        update_employee_positions(
+            cursor,
+            [(update["id"], update["x"], update["y"], now_ms) for update in updates]
+        )
+    for update in updates:
+        position_tracker.mark_persisted(update["id"], update["x"], update["y"], now_ms)
+
+    broadcast_positions(updates)
+
+# ========== DIFFUSION TEMPS RÉEL DES POSITIONS ==========
+
+TRACKING_NAMESPACE = "/tracking"
+TRACKING_ROOM = "positions"
+
+def tracking_snapshot():
+    """État initial envoyé à un tableau de bord qui se connecte."""
+    with db_connection() as conn:
+        cur = conn.cursor()
+        cur.execute("""
+            SELECT id, nom, prenom, type, last_position_x, last_position_y, last_seen
+            FROM employees
+            WHERE is_active = 1
+            ORDER BY nom, prenom
+        """)
+        rows = cur.fetchall()
+
+        employees = (
+            [dict(row) for row in rows] if DB_DRIVER == "postgres"
+            else [dict(zip([col[0] for col in cur.description], row)) for row in rows]
+        )
+        cur.close()
+    return employees
+
+def broadcast_positions(updates):
+    """Diffuse les deltas compacts (id, x, y, last_seen) à la room des tableaux de bord."""
+    if not updates or not SOCKETIO_AVAILABLE:
+        return
+    socketio.emit("positions", updates, namespace=TRACKING_NAMESPACE, to=TRACKING_ROOM)
+
+if SOCKETIO_AVAILABLE:
+    @socketio.on("connect", namespace=TRACKING_NAMESPACE)
+    def tracking_socket_connect():
+        join_room(TRACKING_ROOM)
+        emit("snapshot", tracking_snapshot())
+        logger.info(f"🖥️ Tableau de bord connecté au suivi ({request.sid})")
+
+    @socketio.on("snapshot", namespace=TRACKING_NAMESPACE)
+    def tracking_socket_snapshot():
+        """Renvoie l'état complet à la demande (ex: employé inconnu du client)."""
+        emit("snapshot", tracking_snapshot())
+
+# ========== MOTEUR DE POSITION EN ARRIÈRE-PLAN ==========
+
+# Fréquence de recalcul des positions (Hz). 0 = calcul synchrone à chaque rapport d'ancre.
+POSITION_TICK_HZ = float(os.getenv("POSITION_TICK_HZ", "2"))
+
+class PositionEngine:
+    """
+    Recalcule les positions à fréquence fixe, découplé de l'ingestion RSSI.
+    L'ingestion marque les employés ayant reçu de nouvelles mesures ;
+    chaque tick ne traite que ces employés.
+    """
+
+    def __init__(self, tick_hz):
+        self.tick_hz = tick_hz
+        self.enabled = tick_hz > 0
+        self._dirty = set()
+        self._lock = threading.Lock()
+        self._started = False
+
+    def mark_dirty(self, employee_ids):
+        with self._lock:
+            self._dirty.update(employee_ids)
+        self.start()
+
+    def _take_dirty(self):
+        with self._lock:
+            dirty, self._dirty = self._dirty, set()
+        return dirty
+
+    def start(self):
+        """Démarre la boucle de calcul (une seule fois, au premier rapport)."""
+        if not self.enabled or self._started:
+            return
+        with self._lock:
+            if self._started:
+                return
+            self._started = True
+
+        start_background_task(self._run, "position-engine")
+        logger.info(f"✅ Moteur de position démarré ({self.tick_hz} Hz)")
+
+    def _run(self):
+        interval = 1.0 / self.tick_hz
+        while True:
+            started = time.monotonic()
+            try:
+                self.tick()
+            except Exception as e:
+                logger.error(f"❌ PositionEngine.tick: {e}", exc_info=True)
+            background_sleep(max(0.0, interval - (time.monotonic() - started)))
+
+    def tick(self):
+        """Recalcule les positions des employés ayant de nouvelles mesures."""
+        dirty = self._take_dirty()
+        if not dirty:
+            return
+
+        with db_connection() as conn:
+            cur = conn.cursor()
+            calculate_and_broadcast_positions(cur, dirty)
+            conn.commit()
+            cur.close()
+        logger.info(f"   📍 Positions recalculées ({len(dirty)} employés)")
+
+
+position_engine = PositionEngine(POSITION_TICK_HZ)
+
+# ========== FLUX DES POINTAGES (LCD) ==========
+
+# Nombre de pointages gardés en mémoire pour les abonnés en retard
+POINTAGE_FEED_SIZE = 100
+# Attente maximale d'un long-poll et intervalle des keep-alive SSE (secondes)
+POINTAGE_FEED_TIMEOUT = float(os.getenv("POINTAGE_FEED_TIMEOUT", "25"))
+
+class PointageFeed:
+    """
+    Derniers pointages en mémoire, publiés directement par add_pointage.
+    Chaque événement porte un numéro de séquence croissant ; les abonnés
+    (long-poll, SSE) attendent sur une condition au lieu d'interroger la base.
+    Un pointage sans ancre est diffusé à tous les abonnés.
+    La séquence repart de 0 à chaque démarrage : les curseurs publics
+    ("<epoch>:<seq>") portent l'instant de démarrage pour détecter un redémarrage.
+    """
+
+    def __init__(self, size):
+        self._events = deque(maxlen=size)
+        self._seq = 0
+        self._cond = threading.Condition()
+        self.epoch = str(int(time.time() * 1000))
+
+    @property
+    def seq(self):
+        return self._seq
+
+    @property
+    def empty(self):
+        return not self._events
+
+    def cursor(self, seq=None):
+        return f"{self.epoch}:{self._seq if seq is None else seq}"
+
+    def parse_cursor(self, value):
+        """
+        Séquence à partir de laquelle reprendre. Sans curseur : pointages à venir seulement.
+        Curseur d'un démarrage précédent, ou en avance sur la séquence courante :
+        rejoue tout le tampon plutôt que d'attendre une séquence jamais atteinte.
+        Lève ValueError si le curseur est illisible.
+        """
+        if value in (None, ""):
+            return self._seq
+        epoch, _, seq = str(value).rpartition(":")
+        seq = int(seq)
+        if epoch != self.epoch or seq > self._seq:
+            return 0
+        return seq
+
+    def publish(self, event):
+        with self._cond:
+            self._seq += 1
+            event = dict(event, seq=self._seq, cursor=self.cursor(self._seq))
+            self._events.append(event)
+            self._cond.notify_all()
+        return event
+
+    def _since(self, seq, anchor_id):
+        return [
+            event for event in self._events
+            if event["seq"] > seq
+            and (anchor_id is None or event["anchor_id"] in (None, anchor_id))
+        ]
+
+    def wait(self, seq, anchor_id=None, timeout=POINTAGE_FEED_TIMEOUT):
+        """Retourne (événements après seq, curseur courant) dès qu'il y en a, ou à l'expiration."""
+        deadline = time.monotonic() + timeout
+        with self._cond:
+            while True:
+                events = self._since(seq, anchor_id)
+                remaining = deadline - time.monotonic()
+                if events or remaining <= 0:
+                    return events, self.cursor()
+                self._cond.wait(remaining)
+
+    def latest(self, max_age_ms, anchor_id=None):
+        """Dernier pointage horodaté de moins de max_age_ms, ou None."""
+        threshold = int(datetime.now().timestamp() * 1000) - max_age_ms
+        with self._cond:
+            events = self._since(0, anchor_id)
+        for event in reversed(events):
+            if event["timestamp"] > threshold:
+                return event
+        return None
+
+
+pointage_feed = PointageFeed(POINTAGE_FEED_SIZE)
+
+def publish_pointage(pointage):
+    """Publie un pointage enregistré : flux mémoire + événement Socket.IO pour les LCD."""
+    event = pointage_feed.publish(pointage)
+    if SOCKETIO_AVAILABLE:
+        # Date / heure UTC au format attendu par websocketlcd.ino ("DD/MM/YY", "HH:MM")
+        moment = datetime.fromtimestamp(event["timestamp"] / 1000, timezone.utc)
+        payload = dict(event, date=moment.strftime("%d/%m/%y"), time=moment.strftime("%H:%M"))
+        room = f"anchor-{event['anchor_id']}" if event["anchor_id"] is not None else None
+        socketio.emit("pointage_event", payload, namespace=RSSI_NAMESPACE, to=room)
+    return event
+
+def feed_anchor_id():
+    """Filtre ?anchor_id= des abonnés (None = tous les pointages)."""
+    anchor_id = request.args.get("anchor_id")
+    return int(anchor_id) if anchor_id not in (None, "") else None
 
 @app.route("/api/pointages/recent", methods=["GET"])
 def get_recent_pointages():
     """
     Retourne le dernier pointage des 10 dernières secondes
-    pour affichage temps réel sur LCD
+    pour affichage temps réel sur LCD (lu en mémoire, sans requête SQL).
+    Juste après un redémarrage, tant que le flux mémoire est vide, lecture en base
+    (la table pointages ne connaît pas l'ancre : anchor_id n'y filtre pas).
     """
     try:
-        anchor_id = request.args.get("anchor_id")
-        threshold = int((datetime.now().timestamp() - 10) * 1000)
-        
-        conn = get_db()
+        anchor_id = feed_anchor_id()
+    except ValueError:
+        return jsonify({"success": False, "message": "anchor_id doit être un entier"}), 400
+
+    keys = ("id", "employee_name", "type", "timestamp", "nom", "prenom")
+    if pointage_feed.empty:
+        try:
+            event = latest_pointage_from_db(10_000)
+        except Exception as e:
+            logger.error(f"❌ get_recent_pointages: {e}", exc_info=True)
+            return jsonify({"success": False, "message": str(e)}), 500
+    else:
+        event = pointage_feed.latest(10_000, anchor_id)
+
+    pointages = []
+    if event:
+        pointages.append({key: event[key] for key in keys})
+        logger.info(f"📺 Pointage récent trouvé: {event['prenom']} {event['nom']} - {event['type']}")
+
+    return jsonify({"success": True, "pointages": pointages}), 200
+
+def latest_pointage_from_db(max_age_ms):
+    """Dernier pointage enregistré en base depuis moins de max_age_ms, ou None."""
+    threshold = int(datetime.now().timestamp() * 1000) - max_age_ms
+    with db_connection() as conn:
         cur = conn.cursor()
-        
         cur.execute(f"""
             SELECT p.id, p.employee_name, p.type, p.timestamp,
                    e.nom, e.prenom
@@ -815,71 +2567,96 @@ def get_recent_pointages():
             ORDER BY p.timestamp DESC
             LIMIT 1
         """, (threshold,))
-        
         row = cur.fetchone()
-        pointages = []
-        
-        if row:
-            if DB_DRIVER == "sqlite":
-                pointage = {
-                    "id": row[0],
-                    "employee_name": row[1],
-                    "type": row[2],
-                    "timestamp": row[3],
-                    "nom": row[4],
-                    "prenom": row[5]
-                }
-            else:
-                pointage = {
-                    "id": row['id'],
-                    "employee_name": row['employee_name'],
-                    "type": row['type'],
-                    "timestamp": row['timestamp'],
-                    "nom": row['nom'],
-                    "prenom": row['prenom']
-                }
-            pointages.append(pointage)
-        
+        columns = [col[0] for col in cur.description]
         cur.close()
-        conn.close()
-        
-        if pointages:
-            logger.info(f"📺 Pointage récent trouvé: {pointages[0]['prenom']} {pointages[0]['nom']} - {pointages[0]['type']}")
-        else:
-            logger.info(f"📺 Aucun pointage récent (< 10s)")
-        
-        return jsonify({"success": True, "pointages": pointages}), 200
-        
-    except Exception as e:
-        logger.error(f"❌ get_recent_pointages: {e}", exc_info=True)
-        return jsonify({"success": False, "message": str(e)}), 500
+    if row is None:
+        return None
+    return dict(row) if DB_DRIVER == "postgres" else dict(zip(columns, row))
+
+@app.route("/api/pointages/feed", methods=["GET"])
+def poll_pointages():
+    """
+    Long-poll : répond dès qu'un pointage postérieur à `since` arrive, ou après `timeout` s.
+    Sans `since`, seuls les pointages à venir sont attendus. Renvoyer `cursor` comme `since`
+    (après un redémarrage du serveur, le tampon mémoire est rejoué en entier).
+    """
+    try:
+        anchor_id = feed_anchor_id()
+        since = pointage_feed.parse_cursor(request.args.get("since"))
+        timeout = min(float(request.args.get("timeout", POINTAGE_FEED_TIMEOUT)), POINTAGE_FEED_TIMEOUT)
+    except ValueError:
+        return jsonify({"success": False, "message": "anchor_id, since et timeout doivent être numériques"}), 400
+
+    events, cursor = pointage_feed.wait(since, anchor_id, timeout)
+    return jsonify({"success": True, "pointages": events, "cursor": cursor}), 200
+
+@app.route("/api/pointages/stream", methods=["GET"])
+def stream_pointages():
+    """
+    Server-Sent Events : un événement `pointage` par enregistrement, keep-alive entre deux.
+    L'id SSE est le curseur "<epoch>:<seq>" ; à la reconnexion, Last-Event-ID est traité
+    comme `since` du long-poll.
+    """
+    try:
+        anchor_id = feed_anchor_id()
+        since = pointage_feed.parse_cursor(request.headers.get("Last-Event-ID"))
+    except ValueError:
+        return jsonify({"success": False, "message": "anchor_id ou Last-Event-ID invalide"}), 400
+
+    def generate():
+        seq = since
+        yield "retry: 3000\n\n"
+        while True:
+            events, _ = pointage_feed.wait(seq, anchor_id)
+            if not events:
+                yield ": keep-alive\n\n"
+                continue
+            for event in events:
+                seq = event["seq"]
+                yield f"id: {event['cursor']}\nevent: pointage\ndata: {json.dumps(event)}\n\n"
+
+    response = Response(generate(), mimetype="text/event-stream")
+    response.headers["Cache-Control"] = "no-cache"
+    response.headers["X-Accel-Buffering"] = "no"
+    return response
+
+# ========== AUTRES ROUTES ==========
 
 @app.route("/api/employees/active", methods=["GET"])
 def get_active_employees():
     try:
-        conn = get_db()
-        cursor = conn.cursor()
-        cursor.execute(f"""
-            SELECT id, nom, prenom, type, is_active, created_at,
-                   email, telephone, taux_horaire, frais_ecolage,
-                   profession, date_naissance, lieu_naissance,
-                   last_position_x, last_position_y, last_seen
-            FROM employees 
-            WHERE is_active = 1
-            ORDER BY nom, prenom
-        """)
-        rows = cursor.fetchall()
-
-        employees = (
-            [dict(row) for row in rows] if DB_DRIVER == "postgres"
-            else [dict(zip([col[0] for col in cursor.description], row)) for row in rows]
-        )
+        with db_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute(f"""
+                SELECT id, nom, prenom, type, is_active, created_at,
+                       email, telephone, taux_horaire, frais_ecolage,
+                       profession, date_naissance, lieu_naissance,
+                       last_position_x, last_position_y, last_seen
+                FROM employees 
+                WHERE is_active = 1
+                ORDER BY nom, prenom
+            """)
+            rows = cursor.fetchall()
+
+            employees = (
+                [dict(row) for row in rows] if DB_DRIVER == "postgres"
+                else [dict(zip([col[0] for col in cursor.description], row)) for row in rows]
+            )
 
-        conn.close()
-        return jsonify({"success": True, "employees": employees}), 200
+            return jsonify({"success": True, "employees": employees}), 200
     except Exception as e:
         logger.error(f"❌ get_active_employees: {e}")
         return jsonify({"success": False, "message": str(e)}), 500
+def normalize_pointage_type(pointage_type):
+    """'arrivee' / 'sortie' à partir des variantes acceptées, None si invalide."""
+    pointage_type = (pointage_type or "").lower().strip()
+    if pointage_type in ['entree', 'entrée', 'entry', 'in', 'arrivee']:
+        return 'arrivee'
+    if pointage_type in ['sortie', 'exit', 'out']:
+        return 'sortie'
+    return None
+
 # === POST ajouter pointage (✅ CORRIGÉ POUR ANDROID) ===
 @app.route("/api/pointages", methods=["POST"])
 def add_pointage():
@@ -905,84 +2682,96 @@ def add_pointage():
     if not timestamp or not date:
         return jsonify({"success": False, "message": "Champs manquants: timestamp ou date"}), 400
     
+    # ✅ Ancre optionnelle (afficheur LCD qui a scanné le badge)
+    anchor_id = data.get("anchor_id", data.get("anchorId"))
     try:
-        conn = get_db()
-        cur = conn.cursor()
+        anchor_id = parse_anchor_id(anchor_id) if anchor_id is not None else None
+    except ValueError:
+        return jsonify({"success": False, "message": "anchor_id doit être un entier"}), 400
+    
+    try:
+        with db_connection() as conn:
+            cur = conn.cursor()
         
-        # ✅ RÉCUPÉRER L'EMPLOYÉ DEPUIS LA BDD
-        cur.execute(f"SELECT id, nom, prenom, type FROM employees WHERE id = {PLACEHOLDER}", (emp_id,))
-        employee = cur.fetchone()
+            # ✅ RÉCUPÉRER L'EMPLOYÉ DEPUIS LA BDD
+            cur.execute(f"SELECT id, nom, prenom, type FROM employees WHERE id = {PLACEHOLDER}", (emp_id,))
+            employee = cur.fetchone()
         
-        if not employee:
-            cur.close()
-            conn.close()
-            logger.error(f"❌ Employé {emp_id} non trouvé en base")
-            return jsonify({
-                "success": False, 
-                "message": f"Employé {emp_id} non trouvé. Veuillez synchroniser les employés."
-            }), 404
+            if not employee:
+                cur.close()
+                logger.error(f"❌ Employé {emp_id} non trouvé en base")
+                return jsonify({
+                    "success": False, 
+                    "message": f"Employé {emp_id} non trouvé. Veuillez synchroniser les employés."
+                }), 404
         
-        # ✅ CONSTRUIRE LE NOM EXACT : "Nom Prénom"
-        emp_nom = employee[1] if DB_DRIVER == "sqlite" else employee['nom']
-        emp_prenom = employee[2] if DB_DRIVER == "sqlite" else employee['prenom']
-        emp_type = employee[3] if DB_DRIVER == "sqlite" else employee['type']
-        employee_name = f"{emp_nom} {emp_prenom}"
+            # ✅ CONSTRUIRE LE NOM EXACT : "Nom Prénom"
+            emp_nom = employee[1] if DB_DRIVER == "sqlite" else employee['nom']
+            emp_prenom = employee[2] if DB_DRIVER == "sqlite" else employee['prenom']
+            emp_type = employee[3] if DB_DRIVER == "sqlite" else employee['type']
+            employee_name = f"{emp_nom} {emp_prenom}"
         
-        # ✅ NORMALISER LE TYPE DE POINTAGE (accepter plusieurs formats)
-        pointage_type_normalized = pointage_type.lower()
+            # ✅ NORMALISER LE TYPE DE POINTAGE (accepter plusieurs formats)
+            pointage_type_normalized = normalize_pointage_type(pointage_type)
         
-        if pointage_type_normalized in ['entree', 'entrée', 'entry', 'in']:
-            pointage_type_normalized = 'arrivee'
-        elif pointage_type_normalized in ['sortie', 'exit', 'out']:
-            pointage_type_normalized = 'sortie'
-        elif pointage_type_normalized not in ['arrivee', 'sortie']:
-            cur.close()
-            conn.close()
-            return jsonify({
-                "success": False, 
-                "message": f"Type de pointage invalide: '{pointage_type}'. Utilisez 'arrivee' ou 'sortie'."
-            }), 400
+            if pointage_type_normalized is None:
+                cur.close()
+                return jsonify({
+                    "success": False, 
+                    "message": f"Type de pointage invalide: '{pointage_type}'. Utilisez 'arrivee' ou 'sortie'."
+                }), 400
         
-        logger.info(f"✅ Type normalisé: '{pointage_type}' → '{pointage_type_normalized}'")
+            logger.info(f"✅ Type normalisé: '{pointage_type}' → '{pointage_type_normalized}'")
         
-        # ✅ METTRE À JOUR is_active SELON LE TYPE
-        new_is_active = 1 if pointage_type_normalized == 'arrivee' else 0
+            # ✅ METTRE À JOUR is_active SELON LE TYPE
+            new_is_active = 1 if pointage_type_normalized == 'arrivee' else 0
         
-        cur.execute(f"""
-            UPDATE employees 
-            SET is_active = {PLACEHOLDER}, last_seen = {PLACEHOLDER}
-            WHERE id = {PLACEHOLDER}
-        """, [new_is_active, int(timestamp), emp_id])
+            cur.execute(f"""
+                UPDATE employees 
+                SET is_active = {PLACEHOLDER}, last_seen = {PLACEHOLDER}
+                WHERE id = {PLACEHOLDER}
+            """, [new_is_active, int(timestamp), emp_id])
         
-        # ✅ INSÉRER LE POINTAGE AVEC LE NOM CORRECT
-        pointage_id = str(uuid.uuid4())
-        cur.execute(f"""
-            INSERT INTO pointages (id, employee_id, employee_name, type, timestamp, date)
-            VALUES ({PLACEHOLDER}, {PLACEHOLDER}, {PLACEHOLDER}, {PLACEHOLDER}, {PLACEHOLDER}, {PLACEHOLDER})
-        """, [
-            pointage_id, 
-            emp_id, 
-            employee_name,           # ✅ Format: "Razafiarinirina Angela"
-            pointage_type_normalized, # ✅ Format: "arrivee" ou "sortie"
-            int(timestamp), 
-            date
-        ])
+            # ✅ INSÉRER LE POINTAGE AVEC LE NOM CORRECT
+            pointage_id = str(uuid.uuid4())
+            cur.execute(f"""
+                INSERT INTO pointages (id, employee_id, employee_name, type, timestamp, date)
+                VALUES ({PLACEHOLDER}, {PLACEHOLDER}, {PLACEHOLDER}, {PLACEHOLDER}, {PLACEHOLDER}, {PLACEHOLDER})
+            """, [
+                pointage_id, 
+                emp_id, 
+                employee_name,           # ✅ Format: "Razafiarinirina Angela"
+                pointage_type_normalized, # ✅ Format: "arrivee" ou "sortie"
+                int(timestamp), 
+                date
+            ])
         
-        conn.commit()
-        cur.close()
-        conn.close()
+            conn.commit()
+            cur.close()
         
-        logger.info(f"✅ Pointage enregistré: {employee_name} ({emp_type}) - {pointage_type_normalized} (is_active={new_is_active})")
+            logger.info(f"✅ Pointage enregistré: {employee_name} ({emp_type}) - {pointage_type_normalized} (is_active={new_is_active})")
+
+            # ✅ Diffusion immédiate aux afficheurs abonnés
+            publish_pointage({
+                "id": pointage_id,
+                "employee_id": emp_id,
+                "employee_name": employee_name,
+                "nom": emp_nom,
+                "prenom": emp_prenom,
+                "type": pointage_type_normalized,
+                "timestamp": int(timestamp),
+                "anchor_id": anchor_id
+            })
         
-        return jsonify({
-            "success": True,
-            "message": f"Pointage {pointage_type_normalized} enregistré avec succès",
-            "pointageId": pointage_id,
-            "employeeName": employee_name,
-            "employeeType": emp_type,
-            "type": pointage_type_normalized,
-            "is_active": new_is_active
-        }), 201
+            return jsonify({
+                "success": True,
+                "message": f"Pointage {pointage_type_normalized} enregistré avec succès",
+                "pointageId": pointage_id,
+                "employeeName": employee_name,
+                "employeeType": emp_type,
+                "type": pointage_type_normalized,
+                "is_active": new_is_active
+            }), 201
         
     except Exception as e:
         logger.error(f"❌ add_pointage: {e}", exc_info=True)
@@ -990,33 +2779,307 @@ def add_pointage():
             "success": False, 
             "message": f"Erreur serveur: {str(e)}"
         }), 500
+
+# === POST synchronisation groupée des pointages (Android hors ligne) ===
+POINTAGE_BATCH_MAX = int(os.getenv("POINTAGE_BATCH_MAX", "1000"))
+
+@app.route("/api/pointages/batch", methods=["POST"])
+def add_pointages_batch():
+    """
+    Synchronise en une requête les pointages mis en file hors ligne.
+    Corps : {"pointages": [{id, employeeId, type, timestamp, date}, ...]} (ou la liste seule).
+    - employés résolus en une seule requête ;
+    - insertion idempotente sur l'id fourni par le client (renvoi sans doublon) ;
+    - is_active / last_seen appliqués depuis le dernier événement de chaque employé,
+      seulement s'il est plus récent que les pointages déjà connus.
+    Retourne un résultat par élément : created, duplicate ou error.
+    Ces pointages différés ne sont pas publiés sur le flux des afficheurs.
+    """
+    data = request.get_json(silent=True)
+    items = data.get("pointages") if isinstance(data, dict) else data
+    if not isinstance(items, list) or not items:
+        return jsonify({"success": False, "message": "Liste 'pointages' manquante ou vide"}), 400
+    if len(items) > POINTAGE_BATCH_MAX:
+        return jsonify({
+            "success": False,
+            "message": f"Lot trop volumineux: {len(items)} > {POINTAGE_BATCH_MAX}"
+        }), 400
+
+    results = [None] * len(items)
+    valid = {}  # id → (index, employee_id, type, timestamp, date)
+
+    # ✅ Validation locale, sans base
+    for index, item in enumerate(items):
+        if not isinstance(item, dict):
+            results[index] = {"id": None, "status": "error", "message": "Élément invalide"}
+            continue
+        pointage_id = item.get("id")
+        emp_id = item.get("employeeId") or item.get("employee_id")
+        pointage_type = normalize_pointage_type(item.get("type"))
+        timestamp = item.get("timestamp")
+        date = item.get("date")
+
+        if isinstance(pointage_id, (str, int)) and not isinstance(pointage_id, bool):
+            # La colonne id est TEXT : un id numérique est stocké sous forme de chaîne
+            pointage_id = str(pointage_id).strip()
+        elif pointage_id is not None:
+            results[index] = {"id": None, "status": "error", "message": "id doit être une chaîne ou un entier"}
+            continue
+
+        if not pointage_id:
+            message = "Champ manquant: id"
+        elif not emp_id:
+            message = "Champ manquant: employeeId"
+        elif pointage_type is None:
+            message = f"Type de pointage invalide: '{item.get('type')}'"
+        elif not timestamp or not date:
+            message = "Champs manquants: timestamp ou date"
+        elif pointage_id in valid:
+            results[index] = {"id": pointage_id, "status": "duplicate"}
+            continue
+        else:
+            try:
+                valid[pointage_id] = (index, emp_id, pointage_type, int(timestamp), date)
+                continue
+            except (ValueError, TypeError):
+                message = "timestamp doit être un entier"
+        results[index] = {"id": pointage_id, "status": "error", "message": message}
+
+    try:
+        with db_connection() as conn:
+            cur = conn.cursor()
+
+            if valid:
+                # ✅ Tous les employés référencés en une requête
+                employee_ids = list({entry[1] for entry in valid.values()})
+                placeholders = ", ".join([PLACEHOLDER] * len(employee_ids))
+                cur.execute(
+                    f"SELECT id, nom, prenom FROM employees WHERE id IN ({placeholders})",
+                    employee_ids
+                )
+                names = {}
+                for row in cur.fetchall():
+                    emp_id = row[0] if DB_DRIVER == "sqlite" else row['id']
+                    nom = row[1] if DB_DRIVER == "sqlite" else row['nom']
+                    prenom = row[2] if DB_DRIVER == "sqlite" else row['prenom']
+                    names[emp_id] = f"{nom} {prenom}"
+
+                # Dernier pointage déjà connu par employé, pour ne pas rejouer un état ancien
+                known = [emp_id for emp_id in employee_ids if emp_id in names]
+                latest_known = {}
+                if known:
+                    placeholders = ", ".join([PLACEHOLDER] * len(known))
+                    cur.execute(f"""
+                        SELECT employee_id, MAX(timestamp) AS latest
+                        FROM pointages
+                        WHERE employee_id IN ({placeholders})
+                        GROUP BY employee_id
+                    """, known)
+                    for row in cur.fetchall():
+                        emp_id = row[0] if DB_DRIVER == "sqlite" else row['employee_id']
+                        latest_known[emp_id] = row[1] if DB_DRIVER == "sqlite" else row['latest']
+
+                rows = []
+                for pointage_id, (index, emp_id, pointage_type, timestamp, date) in valid.items():
+                    if emp_id not in names:
+                        results[index] = {
+                            "id": pointage_id, "status": "error",
+                            "message": f"Employé {emp_id} non trouvé"
+                        }
+                        continue
+                    rows.append((pointage_id, emp_id, names[emp_id], pointage_type, timestamp, date))
+
+                # ✅ Id déjà synchronisés (renvoi après une coupure réseau) : ignorés par l'insertion
+                inserted = insert_pointages(cur, rows)
+
+                latest_event = {}
+                for pointage_id, emp_id, _, pointage_type, timestamp, _ in rows:
+                    index = valid[pointage_id][0]
+                    if pointage_id not in inserted:
+                        results[index] = {"id": pointage_id, "status": "duplicate"}
+                        continue
+                    results[index] = {"id": pointage_id, "status": "created"}
+                    if emp_id not in latest_event or timestamp >= latest_event[emp_id][1]:
+                        latest_event[emp_id] = (pointage_type, timestamp)
+
+                # ✅ État de présence depuis le dernier événement de chaque employé
+                state_updates = [
+                    (1 if pointage_type == 'arrivee' else 0, timestamp, timestamp, emp_id)
+                    for emp_id, (pointage_type, timestamp) in latest_event.items()
+                    if timestamp >= (latest_known.get(emp_id) or 0)
+                ]
+                if state_updates:
+                    cur.executemany(f"""
+                        UPDATE employees
+                        SET is_active = {PLACEHOLDER},
+                            last_seen = CASE WHEN last_seen IS NULL OR last_seen < {PLACEHOLDER}
+                                             THEN {PLACEHOLDER} ELSE last_seen END
+                        WHERE id = {PLACEHOLDER}
+                    """, state_updates)
+
+                conn.commit()
+            cur.close()
+
+        counts = {"created": 0, "duplicate": 0, "error": 0}
+        for result in results:
+            counts[result["status"]] += 1
+        logger.info(
+            f"🔄 Synchronisation pointages: {counts['created']} créés, "
+            f"{counts['duplicate']} doublons, {counts['error']} erreurs"
+        )
+
+        return jsonify({"success": True, "results": results, **counts}), 200
+
+    except Exception as e:
+        logger.error(f"❌ add_pointages_batch: {e}", exc_info=True)
+        return jsonify({"success": False, "message": f"Erreur serveur: {str(e)}"}), 500
+
 @app.route("/api/pointages/history", methods=["GET"])
 def get_pointage_history():
+    """
+    Historique des pointages, plus récent d'abord, paginé sur (timestamp, id).
+    Paramètres : limit, cursor (next_cursor de la page précédente), from, to, employee_id.
+    Sans limit ni cursor, tout l'historique filtré est renvoyé en une réponse.
+    En mode streaming (format=ndjson), toutes les lignes filtrées sont renvoyées sans limite.
+    """
     try:
-        conn = get_db()
-        cur = conn.cursor()
-        cur.execute(f"""
-            SELECT p.id, p.employee_id, p.employee_name, p.type, p.timestamp, p.date,
-                   e.email, e.telephone
-            FROM pointages p
-            LEFT JOIN employees e ON e.id = p.employee_id
-            ORDER BY p.timestamp DESC
-        """)
-        rows = cur.fetchall()
+        conditions, params, limit = history_filters("p.timestamp", "p.id", "p.employee_id")
+    except ValueError as e:
+        return jsonify({"success": False, "message": str(e)}), 400
+
+    where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+    query = f"""
+        SELECT p.id, p.employee_id, p.employee_name, p.type, p.timestamp, p.date,
+               e.email, e.telephone
+        FROM pointages p
+        LEFT JOIN employees e ON e.id = p.employee_id
+        {where}
+        ORDER BY p.timestamp DESC, p.id DESC
+    """
 
-        pointages = (
-            [dict(row) for row in rows] if DB_DRIVER == "postgres"
-            else [dict(zip([col[0] for col in cur.description], row)) for row in rows]
-        )
+    if wants_stream():
+        return ndjson_response(stream_query(query, params))
 
-        cur.close()
-        conn.close()
-        return jsonify({"success": True, "pointages": pointages}), 200
+    try:
+        with db_connection() as conn:
+            cur = conn.cursor()
+            if limit is None:
+                cur.execute(query, params)
+            else:
+                cur.execute(f"{query} LIMIT {PLACEHOLDER}", params + [limit + 1])
+            pointages, next_cursor = history_page(cur, cur.fetchall(), limit, "timestamp")
+
+            cur.close()
+            return jsonify({"success": True, "pointages": pointages, "next_cursor": next_cursor}), 200
     except Exception as e:
         logger.error(f"❌ get_pointage_history: {e}")
         return jsonify({"success": False, "message": str(e)}), 500
 
+# ========== ADMINISTRATION ==========
+
+@app.route("/api/admin/db-pool", methods=["GET"])
+def get_db_pool_stats():
+    """Occupation du pool de connexions (null en SQLite)."""
+    return jsonify({"success": True, "pool": pool_stats()}), 200
+
+@app.route("/api/admin/solver-stats", methods=["GET"])
+def get_solver_stats():
+    """
+    Statistiques des solveurs de trilatération (voir SolverProfiler).
+    ?recent=N ajoute les N derniers appels bruts.
+    """
+    try:
+        recent = max(0, int(request.args.get("recent", 0)))
+    except ValueError:
+        return jsonify({"success": False, "message": "Paramètre recent invalide"}), 400
+
+    return jsonify({
+        "success": True,
+        "solver": TRILATERATION_SOLVER,
+        "room": {"width": ROOM_WIDTH, "height": ROOM_HEIGHT},
+        "stats": solver_profiler.snapshot(recent),
+        "rssi_clamp_events": rssi_distance_table.clamp_counts()
+    }), 200
+
+@app.route("/api/admin/solver-stats", methods=["POST"])
+def update_solver_stats():
+    """Active/désactive le profilage ({"enabled": bool}) et/ou remet à zéro ({"reset": true})."""
+    data = request.get_json(silent=True) or {}
+    if not isinstance(data, dict):
+        return jsonify({"success": False, "message": "Objet JSON attendu"}), 400
+    for field in ("enabled", "reset"):
+        if field in data and not isinstance(data[field], bool):
+            return jsonify({"success": False, "message": f"{field} doit être un booléen JSON"}), 400
+
+    if "enabled" in data:
+        solver_profiler.enabled = data["enabled"]
+    if data.get("reset"):
+        solver_profiler.reset()
+    logger.info(f"🔧 Profilage solveur: enabled={solver_profiler.enabled}, reset={bool(data.get('reset'))}")
+    return jsonify({"success": True, "enabled": solver_profiler.enabled}), 200
+
+@app.route("/metrics", methods=["GET"])
+def get_metrics():
+    """Métriques au format texte Prometheus."""
+    stats = pool_stats()
+    if stats:
+        DB_POOL_CONNECTIONS.set(stats["in_use"], "in_use")
+        DB_POOL_CONNECTIONS.set(stats["idle"], "idle")
+    return Response(render_metrics(), mimetype="text/plain; version=0.0.4")
+
+@app.route("/api/admin/startup", methods=["GET"])
+def get_startup_report():
+    """Durée de chaque étape du démarrage du worker (ms), préchargement compris."""
+    return jsonify({
+        "success": True,
+        "mode": STARTUP_MODE,
+        "timings_ms": {step: round(seconds * 1000, 1) for step, seconds in STARTUP_TIMINGS.items()}
+    }), 200
+
+# ========== RAPPORT ET PRÉCHARGEMENT DU DÉMARRAGE ==========
+
+# Délai (s) avant le préchargement en mode "fast", le temps que le serveur soit à l'écoute
+STARTUP_PRELOAD_DELAY = float(os.getenv("STARTUP_PRELOAD_DELAY", "1"))
+
+STARTUP_STEP_SECONDS = Gauge("startup_step_seconds", "Durée des étapes du démarrage du worker", ["step"])
+
+def report_startup(title, steps):
+    for step in steps:
+        STARTUP_STEP_SECONDS.set(STARTUP_TIMINGS[step], step)
+    details = ", ".join(f"{step} {STARTUP_TIMINGS[step] * 1000:.0f} ms" for step in steps)
+    logger.info(f"⏱️ {title} : {details}")
+
+def preload_startup():
+    """
+    Mode "fast" : chargement de NumPy retiré du démarrage, fait une fois le serveur à l'écoute
+    (le pool a déjà sa première connexion, ouverte par le contrôle schema_ready).
+    """
+    background_sleep(STARTUP_PRELOAD_DELAY)
+    steps = []
+
+    if NUMPY_AVAILABLE:
+        with startup_step("numpy_preload"):
+            # Charge NumPy et numpy.linalg, utilisés par les solveurs vectorisés
+            np.linalg.solve(np.eye(2), np.ones(2))
+        steps.append("numpy_preload")
+
+    report_startup("Préchargement terminé", steps)
+
+# "app" = reste du module : routes, caches et objets d'état
+STARTUP_TIMINGS["app"] = time.perf_counter() - BOOT_STARTED - sum(STARTUP_TIMINGS.values())
+STARTUP_TIMINGS["total"] = time.perf_counter() - BOOT_STARTED
+STARTUP_STEP_SECONDS.set(STARTUP_TIMINGS["total"], "total")
+report_startup(
+    f"Démarrage (mode {STARTUP_MODE}) en {STARTUP_TIMINGS['total'] * 1000:.0f} ms",
+    [step for step in STARTUP_TIMINGS if step != "total"]
+)
+if STARTUP_MODE == "fast":
+    start_background_task(preload_startup, "startup-preload")
+
 # --- Démarrage ---
 if __name__ == "__main__":
     port = int(os.getenv("PORT", 8000))
-    app.run(host="0.0.0.0", port=port, debug=False)
+    if SOCKETIO_AVAILABLE:
+        socketio.run(app, host="0.0.0.0", port=port, debug=False)
+    else:
+        app.run(host="0.0.0.0", port=port, debug=False)
@@ -0,0 +1,386 @@
+"""
+Générateur de charge synthétique pour les ancres ESP32.
+
+Simule des ancres qui envoient des rapports RSSI (POST /api/rssi-data) pour des
+badges en mouvement, puis mesure toute la chaîne ingestion → positionnement :
+débit d'ingestion, latence p50/p99 des requêtes, délai rapport → position
+publiée et erreur de position par rapport à la vérité terrain.
+
+Deux modes :
+  - inprocess : l'application Flask est importée et pilotée via test_client(),
+    sur une base SQLite temporaire (tracking.db n'est jamais touchée).
+  - http      : rapports envoyés à un serveur déjà lancé (--url). Les positions
+    sont suivies via Socket.IO (/tracking) si python-socketio client est installé.
+    Lancer le serveur avec les mêmes ROOM_WIDTH / ROOM_HEIGHT que la simulation.
+
+Exemples :
+    python benchmark_anchors.py --badges 20 --rate 2 --duration 30
+    python benchmark_anchors.py --layout grid --width 20 --height 12 --anchors 12 --badges 100
+    python benchmark_anchors.py --mode http --url http://localhost:8000 --badges 10
+"""
+import os
+import sys
+import json
+import math
+import time
+import random
+import logging
+import argparse
+import tempfile
+import threading
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(levelname)s: %(message)s'
+)
+logger = logging.getLogger(__name__)
+
+# Modèle de propagation par défaut de l'application (calibration non modifiée)
+TX_POWER = -59
+PATH_LOSS_EXPONENT = 2.5
+# En dessous de ce niveau, une ancre ne voit pas le badge
+SENSITIVITY_DBM = -95
+
+# Disposition réelle des trois ancres (voir websocketlcd.ino)
+ROOM_ANCHORS = [(0.2, 0.2), (0.2, 4.8), (5.8, 4.8)]
+
+
+def percentile(values, p):
+    """Percentile par rang le plus proche (None si la liste est vide)."""
+    if not values:
+        return None
+    ordered = sorted(values)
+    rank = max(0, math.ceil(p / 100 * len(ordered)) - 1)
+    return ordered[rank]
+
+
+def build_anchors(layout, width, height, count):
+    """Positions des ancres : disposition réelle ("room") ou grille régulière."""
+    if layout == "room":
+        return list(ROOM_ANCHORS)
+
+    columns = max(2, math.ceil(math.sqrt(count * width / height)))
+    rows = max(2, math.ceil(count / columns))
+    margin = 0.2
+    anchors = []
+    for row in range(rows):
+        for col in range(columns):
+            x = margin + (width - 2 * margin) * col / (columns - 1)
+            y = margin + (height - 2 * margin) * row / (rows - 1)
+            anchors.append((round(x, 2), round(y, 2)))
+    return anchors[:count]
+
+
+class Badge:
+    """Badge en marche aléatoire à vitesse constante, rebondissant sur les murs."""
+
+    def __init__(self, index, width, height, speed, rng):
+        self.nom = f"Bench{index:04d}"
+        self.prenom = "Badge"
+        self.ssid = f"{self.nom} {self.prenom}"
+        self.mac = "02:00:00:%02x:%02x:%02x" % ((index >> 16) & 0xff, (index >> 8) & 0xff, index & 0xff)
+        self.width, self.height = width, height
+        self.x = rng.uniform(0.5, width - 0.5)
+        self.y = rng.uniform(0.5, height - 0.5)
+        heading = rng.uniform(0, 2 * math.pi)
+        self.vx, self.vy = speed * math.cos(heading), speed * math.sin(heading)
+        self.employee_id = None
+        self._lock = threading.Lock()
+
+    def move(self, dt):
+        with self._lock:
+            self.x += self.vx * dt
+            self.y += self.vy * dt
+            if not 0 <= self.x <= self.width:
+                self.vx = -self.vx
+                self.x = min(max(self.x, 0.0), self.width)
+            if not 0 <= self.y <= self.height:
+                self.vy = -self.vy
+                self.y = min(max(self.y, 0.0), self.height)
+
+    def position(self):
+        with self._lock:
+            return self.x, self.y
+
+
+def simulated_rssi(distance, noise_db, rng):
+    """RSSI du modèle log-distance avec bruit gaussien (dBm entiers)."""
+    distance = max(distance, 0.1)
+    rssi = TX_POWER - 10 * PATH_LOSS_EXPONENT * math.log10(distance) + rng.gauss(0, noise_db)
+    return int(round(max(-100, min(-30, rssi))))
+
+
+class InProcessTarget:
+    """Pilote app.py dans ce processus, sur une base SQLite temporaire."""
+
+    def __init__(self, on_positions):
+        self.workdir = tempfile.mkdtemp(prefix="bench_anchors_")
+        os.environ.pop("DATABASE_URL", None)
+        sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+        os.chdir(self.workdir)
+
+        import app as tracking_app
+        self.app = tracking_app
+        # Les journaux par requête de l'application fausseraient les mesures
+        for name in ("app", "database"):
+            logging.getLogger(name).setLevel(logging.WARNING)
+        self._local = threading.local()
+
+        # Intercepter la diffusion pour horodater les positions publiées
+        original_broadcast = tracking_app.broadcast_positions
+
+        def broadcast_positions(updates):
+            on_positions(updates)
+            original_broadcast(updates)
+
+        tracking_app.broadcast_positions = broadcast_positions
+        logger.info(f"🧪 Mode in-process, base SQLite temporaire : {self.workdir}")
+
+    def _client(self):
+        client = getattr(self._local, "client", None)
+        if client is None:
+            client = self._local.client = self.app.app.test_client()
+        return client
+
+    def post(self, path, payload):
+        response = self._client().post(path, json=payload)
+        return response.status_code, response.get_json(silent=True)
+
+    def close(self):
+        pass
+
+
+class HttpTarget:
+    """Envoie les requêtes à un serveur lancé séparément."""
+
+    def __init__(self, url, on_positions):
+        self.url = url.rstrip("/")
+        self.sio = None
+        try:
+            import socketio
+        except ImportError:
+            logger.warning("⚠️ python-socketio absent : délai rapport → position et erreur non mesurés")
+            return
+
+        self.sio = socketio.Client(reconnection=False)
+
+        @self.sio.on("positions", namespace="/tracking")
+        def positions(updates):
+            on_positions(updates)
+
+        try:
+            self.sio.connect(self.url, namespaces=["/tracking"])
+        except Exception as e:
+            logger.warning(f"⚠️ Connexion Socket.IO impossible ({e}) : positions non suivies")
+            self.sio = None
+
+    def post(self, path, payload):
+        request = urllib.request.Request(
+            self.url + path,
+            data=json.dumps(payload).encode(),
+            headers={"Content-Type": "application/json"},
+            method="POST"
+        )
+        try:
+            with urllib.request.urlopen(request, timeout=15) as response:
+                return response.status, json.loads(response.read() or b"null")
+        except urllib.error.HTTPError as e:
+            return e.code, None
+
+    def close(self):
+        if self.sio is not None:
+            self.sio.disconnect()
+
+
+class Benchmark:
+
+    def __init__(self, args):
+        self.args = args
+        self.rng = random.Random(args.seed)
+        self.anchors = build_anchors(args.layout, args.width, args.height, args.anchors)
+        self.badges = [
+            Badge(i, args.width, args.height, args.speed, self.rng) for i in range(args.badges)
+        ]
+        self.by_employee = {}
+
+        self._lock = threading.Lock()
+        self.request_latencies = []
+        self.failures = 0
+        self.measurements = 0
+        # Premier rapport non encore reflété dans une position publiée, par employé
+        self.pending_since = {}
+        self.position_latencies = []
+        self.position_errors = []
+        self.position_updates = 0
+
+        if args.mode == "inprocess":
+            self.target = InProcessTarget(self.on_positions)
+        else:
+            self.target = HttpTarget(args.url, self.on_positions)
+
+    def on_positions(self, updates):
+        now = time.perf_counter()
+        with self._lock:
+            for update in updates:
+                badge = self.by_employee.get(update["id"])
+                if badge is None:
+                    continue
+                self.position_updates += 1
+                true_x, true_y = badge.position()
+                self.position_errors.append(math.hypot(update["x"] - true_x, update["y"] - true_y))
+                since = self.pending_since.pop(update["id"], None)
+                if since is not None:
+                    self.position_latencies.append(now - since)
+
+    def create_badges(self):
+        for badge in self.badges:
+            status, body = self.target.post(
+                "/api/employees", {"nom": badge.nom, "prenom": badge.prenom, "type": "employe"}
+            )
+            if status >= 300 or not body:
+                raise RuntimeError(f"Création de {badge.ssid} impossible (HTTP {status})")
+            badge.employee_id = body["id"]
+            self.by_employee[badge.employee_id] = badge
+        logger.info(f"👥 {len(self.badges)} badges créés, {len(self.anchors)} ancres")
+
+    def report(self, anchor_id, anchor_x, anchor_y, rng):
+        """Un rapport d'ancre : tous les badges à portée, avec bruit RSSI."""
+        badges = []
+        for badge in self.badges:
+            x, y = badge.position()
+            rssi = simulated_rssi(math.hypot(x - anchor_x, y - anchor_y), self.args.noise, rng)
+            if rssi >= SENSITIVITY_DBM:
+                badges.append((badge, {"ssid": badge.ssid, "mac": badge.mac, "rssi": rssi}))
+
+        payload = {
+            "anchor_id": anchor_id,
+            "anchor_x": anchor_x,
+            "anchor_y": anchor_y,
+            "badges": [entry for _, entry in badges]
+        }
+
+        sent = time.perf_counter()
+        with self._lock:
+            for badge, _ in badges:
+                self.pending_since.setdefault(badge.employee_id, sent)
+
+        status, _ = self.target.post("/api/rssi-data", payload)
+        elapsed = time.perf_counter() - sent
+
+        with self._lock:
+            self.request_latencies.append(elapsed)
+            self.measurements += len(badges)
+            if status >= 300:
+                self.failures += 1
+
+    def run(self):
+        self.create_badges()
+        interval = 1.0 / self.args.rate
+        started = time.perf_counter()
+        deadline = started + self.args.duration
+        next_round = started
+        last_move = started
+        rounds = 0
+
+        with ThreadPoolExecutor(max_workers=self.args.workers) as pool:
+            while time.perf_counter() < deadline:
+                now = time.perf_counter()
+                for badge in self.badges:
+                    badge.move(now - last_move)
+                last_move = now
+
+                seeds = [self.rng.random() for _ in self.anchors]
+                futures = [
+                    pool.submit(self.report, anchor_id, x, y, random.Random(seed))
+                    for anchor_id, ((x, y), seed) in enumerate(zip(self.anchors, seeds), 1)
+                ]
+                for future in futures:
+                    future.result()
+                rounds += 1
+
+                next_round += interval
+                delay = next_round - time.perf_counter()
+                if delay > 0:
+                    time.sleep(delay)
+                else:
+                    # En retard : le serveur ne suit pas le rythme demandé
+                    next_round = time.perf_counter()
+
+        elapsed = time.perf_counter() - started
+        # Laisser le moteur de position traiter les derniers rapports
+        time.sleep(self.args.drain)
+        self.target.close()
+        return self.summary(rounds, elapsed)
+
+    def summary(self, rounds, elapsed):
+        def ms(value):
+            return round(value * 1000, 2) if value is not None else None
+
+        errors = self.position_errors
+        return {
+            "mode": self.args.mode,
+            "layout": self.args.layout,
+            "room": [self.args.width, self.args.height],
+            "anchors": len(self.anchors),
+            "badges": len(self.badges),
+            "target_rate_hz": self.args.rate,
+            "achieved_rate_hz": round(rounds / elapsed, 2),
+            "reports": len(self.request_latencies),
+            "failed_reports": self.failures,
+            "reports_per_s": round(len(self.request_latencies) / elapsed, 1),
+            "measurements_per_s": round(self.measurements / elapsed, 1),
+            "request_p50_ms": ms(percentile(self.request_latencies, 50)),
+            "request_p99_ms": ms(percentile(self.request_latencies, 99)),
+            "position_updates": self.position_updates,
+            "report_to_position_p50_ms": ms(percentile(self.position_latencies, 50)),
+            "report_to_position_p99_ms": ms(percentile(self.position_latencies, 99)),
+            "position_error_mean_m": round(sum(errors) / len(errors), 3) if errors else None,
+            "position_error_p50_m": round(percentile(errors, 50), 3) if errors else None,
+            "position_error_p90_m": round(percentile(errors, 90), 3) if errors else None,
+        }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark ingestion RSSI → positionnement")
+    parser.add_argument("--mode", choices=["inprocess", "http"], default="inprocess")
+    parser.add_argument("--url", default="http://localhost:8000", help="Serveur cible (mode http)")
+    parser.add_argument("--layout", choices=["room", "grid"], default="room",
+                        help="room : les 3 ancres réelles (6×5 m) ; grid : grille de --anchors ancres")
+    parser.add_argument("--width", type=float, default=6.0, help="Largeur de la zone (m)")
+    parser.add_argument("--height", type=float, default=5.0, help="Hauteur de la zone (m)")
+    parser.add_argument("--anchors", type=int, default=4, help="Nombre d'ancres (layout grid)")
+    parser.add_argument("--badges", type=int, default=10)
+    parser.add_argument("--rate", type=float, default=1.0, help="Rapports par ancre et par seconde")
+    parser.add_argument("--duration", type=float, default=20.0, help="Durée de la charge (s)")
+    parser.add_argument("--noise", type=float, default=3.0, help="Écart-type du bruit RSSI (dB)")
+    parser.add_argument("--speed", type=float, default=0.3, help="Vitesse des badges (m/s)")
+    parser.add_argument("--workers", type=int, default=4, help="Requêtes concurrentes")
+    parser.add_argument("--drain", type=float, default=2.0, help="Attente finale du moteur (s)")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--json", action="store_true", help="Sortie JSON uniquement")
+    args = parser.parse_args()
+
+    if args.layout == "room" and (args.width, args.height) != (6.0, 5.0):
+        parser.error("--layout room correspond à la salle de 6×5 m ; utiliser --layout grid")
+
+    # La zone de bornage de app.py doit correspondre à la simulation (mode in-process)
+    os.environ.setdefault("ROOM_WIDTH", str(args.width))
+    os.environ.setdefault("ROOM_HEIGHT", str(args.height))
+    if args.json:
+        logging.disable(logging.INFO)
+
+    results = Benchmark(args).run()
+
+    if args.json:
+        print(json.dumps(results))
+        return
+
+    logger.info("📊 Résultats du benchmark")
+    for key, value in results.items():
+        logger.info(f"   {key:28s} {value}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,19 +1,78 @@
 import os
+import io
+import csv
 import sqlite3
 import psycopg2
+import time
 import logging
-from psycopg2.extras import RealDictCursor
+import threading
+from contextlib import contextmanager
+from datetime import datetime
+from psycopg2.extras import RealDictCursor, execute_values
+from metrics import Histogram
 
 # --- Logger ---
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# psycopg2 bloque le thread pendant les requêtes : sous eventlet (worker gunicorn),
+# psycogreen le rend coopératif pour qu'une requête lente ne gèle pas tout le worker
+try:
+    import eventlet.patcher
+    from psycogreen.eventlet import patch_psycopg
+    if eventlet.patcher.is_monkey_patched("socket"):
+        patch_psycopg()
+        logger.info("✅ psycopg2 rendu coopératif (psycogreen)")
+except ImportError:
+    pass
+
 # URL fournie automatiquement par Render pour Postgres
 DATABASE_URL = os.getenv("DATABASE_URL")
 
 # Driver courant : "postgres" si DATABASE_URL défini, sinon "sqlite"
 DB_DRIVER = "postgres" if DATABASE_URL else "sqlite"
 
+# Pool de connexions PostgreSQL
+DB_POOL_MIN = int(os.getenv("DB_POOL_MIN", "1"))
+DB_POOL_MAX = int(os.getenv("DB_POOL_MAX", "10"))
+# Attente max (s) d'une connexion libre avant erreur
+DB_POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", "10"))
+# Une connexion inactive depuis plus longtemps est vérifiée (SELECT 1) avant réutilisation
+DB_POOL_HEALTHCHECK_SECONDS = float(os.getenv("DB_POOL_HEALTHCHECK_SECONDS", "30"))
+
+# Au-delà de ce nombre de lignes, COPY est plus rapide que execute_values
+RSSI_COPY_THRESHOLD = int(os.getenv("RSSI_COPY_THRESHOLD", "500"))
+
+RSSI_COLUMNS = ("employee_id", "anchor_id", "anchor_x", "anchor_y", "rssi", "mac", "timestamp")
+
+# Rétention des mesures RSSI (heures) et taille des lots de suppression
+RSSI_RETENTION_HOURS = float(os.getenv("RSSI_RETENTION_HOURS", "24"))
+RSSI_PURGE_CHUNK = int(os.getenv("RSSI_PURGE_CHUNK", "5000"))
+# "1" = copier les mesures expirées dans rssi_measurements_archive avant suppression
+RSSI_ARCHIVE = os.getenv("RSSI_ARCHIVE", "0") == "1"
+
+# Nombre de lignes lues par aller-retour lors du streaming des grosses requêtes
+STREAM_CHUNK_SIZE = int(os.getenv("STREAM_CHUNK_SIZE", "500"))
+# Exports en streaming simultanés (chacun garde une connexion du pool jusqu'à la fin) :
+# au-delà, refus immédiat, pour laisser le reste du pool aux requêtes ordinaires
+STREAM_MAX_CONCURRENT = int(os.getenv("STREAM_MAX_CONCURRENT", "2"))
+
+# Index requis : (nom, table, colonnes)
+INDEXES = [
+    ("idx_rssi_measurements_timestamp", "rssi_measurements", "timestamp"),
+    ("idx_rssi_measurements_employee_ts", "rssi_measurements", "employee_id, timestamp"),
+    ("idx_pointages_timestamp_id", "pointages", "timestamp, id"),
+    ("idx_pointages_employee_timestamp_id", "pointages", "employee_id, timestamp, id"),
+    ("idx_salaries_date_id", "salaries", "date, id"),
+    ("idx_salaries_employee_date_id", "salaries", "employee_id, date, id"),
+]
+
+# Tables créées par init_db (contrôle rapide de schema_ready au démarrage)
+SCHEMA_TABLES = (
+    "employees", "salaries", "pointages", "rssi_measurements",
+    "anchor_calibration", "salary_aggregates",
+)
+
 
 def get_db():
     """Retourne une connexion DB (Postgres si DATABASE_URL, sinon SQLite)."""
@@ -30,6 +89,240 @@ def get_db():
         return conn
 
 
+class ConnectionPool:
+    """
+    Pool de connexions borné. Sous eventlet, les verrous threading deviennent des
+    verrous verts (monkey_patch) et psycopg2 est rendu coopératif par psycogreen
+    s'il est installé ; sans lui, chaque requête SQL bloque le worker.
+    Les connexions inactives depuis longtemps sont vérifiées avant réutilisation.
+    """
+
+    def __init__(self, connect, minconn, maxconn, timeout, healthcheck_seconds):
+        self._connect = connect
+        self.minconn = minconn
+        self.maxconn = maxconn
+        self.timeout = timeout
+        self.healthcheck_seconds = healthcheck_seconds
+        self._slots = threading.BoundedSemaphore(maxconn)
+        self._lock = threading.Lock()
+        self._idle = []  # [(connexion, instant de mise au repos)]
+        self._warmed = False
+        self.in_use = 0
+        self.created = 0
+        self.discarded = 0
+        self.waits = 0
+        self.timeouts = 0
+
+    def _new_connection(self):
+        conn = self._connect()
+        with self._lock:
+            self.created += 1
+        return conn
+
+    def _warm(self):
+        with self._lock:
+            if self._warmed:
+                return
+            self._warmed = True
+        for _ in range(self.minconn):
+            self._release_idle(self._new_connection())
+
+    def _release_idle(self, conn):
+        with self._lock:
+            self._idle.append((conn, time.monotonic()))
+
+    def _discard(self, conn):
+        with self._lock:
+            self.discarded += 1
+        try:
+            conn.close()
+        except Exception:
+            pass
+
+    def _is_healthy(self, conn, idle_since):
+        if conn.closed:
+            return False
+        if time.monotonic() - idle_since < self.healthcheck_seconds:
+            return True
+        try:
+            cur = conn.cursor()
+            cur.execute("SELECT 1")
+            cur.close()
+            conn.rollback()
+            return True
+        except Exception as e:
+            logger.warning(f"⚠️ Connexion du pool invalide, remplacement : {e}")
+            return False
+
+    def acquire(self):
+        self._warm()
+
+        if not self._slots.acquire(blocking=False):
+            with self._lock:
+                self.waits += 1
+            if not self._slots.acquire(timeout=self.timeout):
+                with self._lock:
+                    self.timeouts += 1
+                raise RuntimeError(f"Pool de connexions saturé ({self.maxconn} connexions)")
+
+        try:
+            conn = None
+            while conn is None:
+                with self._lock:
+                    idle = self._idle.pop() if self._idle else None
+                if idle is None:
+                    conn = self._new_connection()
+                elif self._is_healthy(*idle):
+                    conn = idle[0]
+                else:
+                    self._discard(idle[0])
+        except Exception:
+            self._slots.release()
+            raise
+
+        with self._lock:
+            self.in_use += 1
+        return conn
+
+    def release(self, conn, discard=False):
+        try:
+            if discard or conn.closed:
+                self._discard(conn)
+            else:
+                # Annuler une éventuelle transaction non validée avant réutilisation
+                if conn.get_transaction_status() != psycopg2.extensions.TRANSACTION_STATUS_IDLE:
+                    conn.rollback()
+                self._release_idle(conn)
+        except Exception as e:
+            logger.warning(f"⚠️ Remise au pool impossible : {e}")
+            self._discard(conn)
+        finally:
+            with self._lock:
+                self.in_use -= 1
+            self._slots.release()
+
+    def stats(self):
+        with self._lock:
+            return {
+                "driver": DB_DRIVER,
+                "min": self.minconn,
+                "max": self.maxconn,
+                "in_use": self.in_use,
+                "idle": len(self._idle),
+                "created": self.created,
+                "discarded": self.discarded,
+                "waits": self.waits,
+                "timeouts": self.timeouts,
+            }
+
+
+_pool = ConnectionPool(get_db, DB_POOL_MIN, DB_POOL_MAX, DB_POOL_TIMEOUT, DB_POOL_HEALTHCHECK_SECONDS) \
+    if DB_DRIVER == "postgres" else None
+
+
+# Temps d'obtention d'une connexion (attente du pool comprise)
+DB_ACQUIRE_SECONDS = Histogram(
+    "db_connection_acquire_seconds", "Temps d'acquisition d'une connexion DB", ["driver"]
+)
+
+
+@contextmanager
+def db_connection():
+    """
+    Fournit une connexion DB pour la durée d'un bloc `with`.
+    Postgres : connexion empruntée au pool puis rendue (rollback si non validée).
+    SQLite : connexion locale ouverte puis fermée (ouverture quasi gratuite).
+    """
+    if _pool is None:
+        with DB_ACQUIRE_SECONDS.time(DB_DRIVER):
+            conn = get_db()
+        try:
+            yield conn
+        finally:
+            conn.close()
+        return
+
+    with DB_ACQUIRE_SECONDS.time(DB_DRIVER):
+        conn = _pool.acquire()
+    broken = False
+    try:
+        yield conn
+    except (psycopg2.InterfaceError, psycopg2.OperationalError):
+        broken = True
+        raise
+    finally:
+        _pool.release(conn, discard=broken)
+
+
+@contextmanager
+def savepoint(cursor, name="item"):
+    """
+    Sous-transaction d'un bloc `with` : en cas d'exception, seules les écritures
+    du bloc sont annulées (ROLLBACK TO SAVEPOINT) et la transaction reste utilisable.
+    """
+    if DB_DRIVER == "sqlite" and not cursor.connection.in_transaction:
+        # Hors transaction, SQLite ouvrirait la transaction sur le SAVEPOINT et RELEASE la validerait
+        cursor.execute("BEGIN")
+    cursor.execute(f"SAVEPOINT {name}")
+    try:
+        yield
+    except Exception:
+        cursor.execute(f"ROLLBACK TO SAVEPOINT {name}")
+        cursor.execute(f"RELEASE SAVEPOINT {name}")
+        raise
+    cursor.execute(f"RELEASE SAVEPOINT {name}")
+
+
+class StreamLimitReached(RuntimeError):
+    """Déjà STREAM_MAX_CONCURRENT exports en cours."""
+
+
+_stream_slots = threading.BoundedSemaphore(STREAM_MAX_CONCURRENT)
+
+
+def stream_query(query, params=(), chunk_size=None):
+    """
+    Générateur de lignes (dict) pour les requêtes volumineuses, lu par paquets.
+    Postgres : curseur nommé (côté serveur), SQLite : fetchmany.
+    La connexion reste empruntée tant que le générateur n'est pas épuisé ou fermé.
+    Lève StreamLimitReached à la première lecture si STREAM_MAX_CONCURRENT
+    exports sont déjà en cours.
+    """
+    chunk_size = chunk_size or STREAM_CHUNK_SIZE
+    if not _stream_slots.acquire(blocking=False):
+        raise StreamLimitReached(f"Trop d'exports simultanés ({STREAM_MAX_CONCURRENT} max)")
+    try:
+        with db_connection() as conn:
+            if DB_DRIVER == "postgres":
+                cursor = conn.cursor(name=f"stream_{threading.get_ident()}_{time.monotonic_ns()}")
+                cursor.itersize = chunk_size
+            else:
+                cursor = conn.cursor()
+            try:
+                cursor.execute(query, params)
+                while True:
+                    rows = cursor.fetchmany(chunk_size)
+                    if not rows:
+                        break
+                    for row in rows:
+                        yield dict(row)
+            finally:
+                cursor.close()
+    finally:
+        _stream_slots.release()
+
+
+def pool_stats():
+    """Statistiques d'utilisation du pool (None en SQLite)."""
+    return _pool.stats() if _pool is not None else None
+
+
+def create_indexes(cursor):
+    """Crée les index de INDEXES (même syntaxe sur les deux drivers)."""
+    for name, table, columns in INDEXES:
+        cursor.execute(f"CREATE INDEX IF NOT EXISTS {name} ON {table} ({columns})")
+
+
 def init_db():
     """Crée les tables nécessaires si elles n'existent pas."""
     if DB_DRIVER == "postgres":
@@ -102,6 +395,31 @@ def init_db():
                 )
             """)
 
+            # Table anchor_calibration : modèle de propagation par ancre
+            cursor.execute("""
+                CREATE TABLE IF NOT EXISTS anchor_calibration (
+                    anchor_id INTEGER PRIMARY KEY,
+                    tx_power REAL NOT NULL DEFAULT -59,
+                    path_loss_exponent REAL NOT NULL DEFAULT 2.5,
+                    updated_at BIGINT
+                )
+            """)
+
+            # Table salary_aggregates : totaux par employé, période et type, tenus à jour par add_salary
+            cursor.execute("""
+                CREATE TABLE IF NOT EXISTS salary_aggregates (
+                    employee_id TEXT REFERENCES employees(id) ON DELETE CASCADE,
+                    period TEXT NOT NULL,
+                    type TEXT NOT NULL,
+                    total_amount REAL NOT NULL DEFAULT 0,
+                    total_hours REAL NOT NULL DEFAULT 0,
+                    count INTEGER NOT NULL DEFAULT 0,
+                    PRIMARY KEY (employee_id, period, type)
+                )
+            """)
+
+            create_indexes(cursor)
+
             conn.commit()
             logger.info("✅ Tables PostgreSQL initialisées avec CASCADE")
         except Exception as e:
@@ -182,6 +500,32 @@ def init_db():
                     )
                 """)
 
+                # Table anchor_calibration : modèle de propagation par ancre
+                cursor.execute("""
+                    CREATE TABLE IF NOT EXISTS anchor_calibration (
+                        anchor_id INTEGER PRIMARY KEY,
+                        tx_power REAL NOT NULL DEFAULT -59,
+                        path_loss_exponent REAL NOT NULL DEFAULT 2.5,
+                        updated_at BIGINT
+                    )
+                """)
+
+                # Table salary_aggregates : totaux par employé, période et type, tenus à jour par add_salary
+                cursor.execute("""
+                    CREATE TABLE IF NOT EXISTS salary_aggregates (
+                        employee_id TEXT NOT NULL,
+                        period TEXT NOT NULL,
+                        type TEXT NOT NULL,
+                        total_amount REAL NOT NULL DEFAULT 0,
+                        total_hours REAL NOT NULL DEFAULT 0,
+                        count INTEGER NOT NULL DEFAULT 0,
+                        PRIMARY KEY (employee_id, period, type),
+                        FOREIGN KEY(employee_id) REFERENCES employees(id) ON DELETE CASCADE
+                    )
+                """)
+
+                create_indexes(cursor)
+
                 conn.commit()
                 logger.info("✅ Tables SQLite initialisées avec CASCADE")
         except Exception as e:
@@ -189,8 +533,38 @@ def init_db():
             raise
 
 
+def schema_ready():
+    """
+    Contrôle rapide (une requête) : toutes les tables de SCHEMA_TABLES existent.
+    Ne remplace pas verify_schema(), lancé par `python database.py migrate`.
+    """
+    placeholders = ", ".join(["%s" if DB_DRIVER == "postgres" else "?"] * len(SCHEMA_TABLES))
+    with db_connection() as conn:
+        cursor = conn.cursor()
+        if DB_DRIVER == "postgres":
+            cursor.execute(f"""
+                SELECT COUNT(*) AS found FROM information_schema.tables
+                WHERE table_schema = current_schema() AND table_name IN ({placeholders})
+            """, SCHEMA_TABLES)
+        else:
+            cursor.execute(f"""
+                SELECT COUNT(*) AS found FROM sqlite_master
+                WHERE type = 'table' AND name IN ({placeholders})
+            """, SCHEMA_TABLES)
+        found = cursor.fetchone()["found"]
+        cursor.close()
+    return found == len(SCHEMA_TABLES)
+
+
+def migrate():
+    """Travail de schéma d'un déploiement : tables et index, agrégats, vérification."""
+    init_db()
+    backfill_salary_aggregates()
+    verify_schema()
+
+
 def verify_schema():
-    """Vérifie la structure de la table employees."""
+    """Vérifie la structure de la table employees et la présence des index."""
     conn = None
     try:
         conn = get_db()
@@ -219,6 +593,20 @@ def verify_schema():
         else:
             logger.info("✅ Schéma employees correct")
 
+        if DB_DRIVER == "postgres":
+            cursor.execute("SELECT indexname FROM pg_indexes WHERE schemaname = current_schema()")
+            indexes = {row["indexname"] for row in cursor.fetchall()}
+        else:
+            cursor.execute("SELECT name FROM sqlite_master WHERE type = 'index'")
+            indexes = {row[0] for row in cursor.fetchall()}
+
+        missing_indexes = [name for name, _, _ in INDEXES if name not in indexes]
+
+        if missing_indexes:
+            logger.error(f"❌ Index manquants : {missing_indexes}")
+        else:
+            logger.info(f"✅ Index présents : {[name for name, _, _ in INDEXES]}")
+
         cursor.close()
     except Exception as e:
         logger.error(f"❌ Erreur verify_schema : {e}")
@@ -304,3 +692,352 @@ def upgrade_foreign_keys():
     finally:
         if conn:
             conn.close()
+
+
+def insert_rssi_measurements(cursor, rows):
+    """
+    Insère un lot de mesures RSSI en une seule instruction.
+    Chaque ligne suit l'ordre de RSSI_COLUMNS.
+    Postgres : execute_values (ou COPY pour les très gros lots), SQLite : executemany.
+    """
+    if not rows:
+        return 0
+
+    columns = ", ".join(RSSI_COLUMNS)
+
+    if DB_DRIVER == "postgres":
+        if len(rows) >= RSSI_COPY_THRESHOLD:
+            buffer = io.StringIO()
+            csv.writer(buffer).writerows(rows)
+            buffer.seek(0)
+            cursor.copy_expert(
+                f"COPY rssi_measurements ({columns}) FROM STDIN WITH (FORMAT csv)",
+                buffer
+            )
+        else:
+            execute_values(
+                cursor,
+                f"INSERT INTO rssi_measurements ({columns}) VALUES %s",
+                rows,
+                page_size=len(rows)
+            )
+    else:
+        placeholders = ", ".join("?" for _ in RSSI_COLUMNS)
+        cursor.executemany(
+            f"INSERT INTO rssi_measurements ({columns}) VALUES ({placeholders})",
+            rows
+        )
+
+    return len(rows)
+
+
+EMPLOYEE_COLUMNS = (
+    "id", "nom", "prenom", "type", "is_active", "created_at",
+    "email", "telephone", "taux_horaire", "frais_ecolage",
+    "profession", "date_naissance", "lieu_naissance"
+)
+
+
+def insert_employees(cursor, rows):
+    """
+    Insère un lot d'employés en une seule instruction.
+    Chaque ligne suit l'ordre de EMPLOYEE_COLUMNS.
+    Postgres : execute_values, SQLite : executemany.
+    """
+    if not rows:
+        return 0
+
+    columns = ", ".join(EMPLOYEE_COLUMNS)
+
+    if DB_DRIVER == "postgres":
+        execute_values(
+            cursor,
+            f"INSERT INTO employees ({columns}) VALUES %s",
+            rows,
+            page_size=len(rows)
+        )
+    else:
+        placeholders = ", ".join("?" for _ in EMPLOYEE_COLUMNS)
+        cursor.executemany(
+            f"INSERT INTO employees ({columns}) VALUES ({placeholders})",
+            rows
+        )
+
+    return len(rows)
+
+
+POINTAGE_COLUMNS = ("id", "employee_id", "employee_name", "type", "timestamp", "date")
+
+
+def insert_pointages(cursor, rows):
+    """
+    Insère un lot de pointages, en ignorant les id déjà présents (idempotent).
+    Chaque ligne suit l'ordre de POINTAGE_COLUMNS.
+    Retourne l'ensemble des id réellement insérés (les autres existaient déjà,
+    y compris s'ils ont été insérés par une requête concurrente).
+    Postgres : execute_values ... RETURNING id, SQLite : rowcount ligne par ligne.
+    """
+    if not rows:
+        return set()
+
+    columns = ", ".join(POINTAGE_COLUMNS)
+
+    if DB_DRIVER == "postgres":
+        inserted = execute_values(
+            cursor,
+            f"INSERT INTO pointages ({columns}) VALUES %s ON CONFLICT (id) DO NOTHING RETURNING id",
+            rows,
+            page_size=len(rows),
+            fetch=True
+        )
+        return {row["id"] for row in inserted}
+
+    placeholders = ", ".join("?" for _ in POINTAGE_COLUMNS)
+    query = f"INSERT INTO pointages ({columns}) VALUES ({placeholders}) ON CONFLICT (id) DO NOTHING"
+    inserted = set()
+    for row in rows:
+        cursor.execute(query, row)
+        if cursor.rowcount == 1:
+            inserted.add(row[0])
+    return inserted
+
+
+def update_employee_positions(cursor, rows):
+    """
+    Écrit les positions d'un passe de calcul en une seule instruction.
+    Chaque ligne : (employee_id, x, y, last_seen).
+    Postgres : UPDATE ... FROM (VALUES ...), SQLite : executemany dans la transaction courante.
+    """
+    if not rows:
+        return 0
+
+    if DB_DRIVER == "postgres":
+        execute_values(
+            cursor,
+            """
+            UPDATE employees AS e
+            SET last_position_x = v.x, last_position_y = v.y, last_seen = v.last_seen
+            FROM (VALUES %s) AS v (id, x, y, last_seen)
+            WHERE e.id = v.id
+            """,
+            rows,
+            template="(%s, %s::real, %s::real, %s::bigint)",
+            page_size=len(rows)
+        )
+    else:
+        cursor.executemany(
+            "UPDATE employees SET last_position_x = ?, last_position_y = ?, last_seen = ? WHERE id = ?",
+            [(x, y, last_seen, employee_id) for employee_id, x, y, last_seen in rows]
+        )
+
+    return len(rows)
+
+
+SALARY_COLUMNS = ("id", "employee_id", "employee_name", "amount", "hours_worked", "type", "period", "date")
+
+
+def upsert_salary(cursor, row):
+    """
+    Crée ou remplace un salaire (ligne dans l'ordre de SALARY_COLUMNS).
+    Retourne l'ancienne ligne (employee_id, period, type, amount, hours_worked)
+    pour corriger les agrégats, ou None si le salaire est nouveau.
+    INSERT ... ON CONFLICT (id) DO NOTHING d'abord : une seule écriture concurrente
+    du même id nouveau le crée, les autres voient la ligne et passent à la mise à jour
+    (ancienne ligne lue FOR UPDATE sur Postgres ; SQLite sérialise déjà les écritures).
+    """
+    placeholder = "%s" if DB_DRIVER == "postgres" else "?"
+    columns = ", ".join(SALARY_COLUMNS)
+    values = ", ".join(placeholder for _ in SALARY_COLUMNS)
+
+    if DB_DRIVER == "postgres":
+        cursor.execute(
+            f"INSERT INTO salaries ({columns}) VALUES ({values}) "
+            f"ON CONFLICT (id) DO NOTHING RETURNING id",
+            row
+        )
+        if cursor.fetchone():
+            return None
+        lock = " FOR UPDATE"
+    else:
+        cursor.execute(
+            f"INSERT INTO salaries ({columns}) VALUES ({values}) ON CONFLICT (id) DO NOTHING",
+            row
+        )
+        if cursor.rowcount == 1:
+            return None
+        lock = ""
+
+    cursor.execute(
+        f"SELECT employee_id, period, type, amount, hours_worked FROM salaries "
+        f"WHERE id = {placeholder}{lock}",
+        (row[0],)
+    )
+    previous = cursor.fetchone()
+    if previous is None:
+        # Supprimé entre l'INSERT et la lecture : on recommence
+        return upsert_salary(cursor, row)
+    updates = ", ".join(f"{column} = {placeholder}" for column in SALARY_COLUMNS[1:])
+    cursor.execute(
+        f"UPDATE salaries SET {updates} WHERE id = {placeholder}",
+        (*row[1:], row[0])
+    )
+    return dict(previous)
+
+
+def apply_salary_aggregate(cursor, employee_id, period, record_type, amount, hours, count=1):
+    """
+    Ajoute un delta aux totaux (employee_id, period, type) de salary_aggregates.
+    Appeler avec des valeurs négatives (count=-1) pour retirer un paiement.
+    À exécuter dans la même transaction que l'écriture sur salaries.
+    """
+    placeholder = "%s" if DB_DRIVER == "postgres" else "?"
+    cursor.execute(f"""
+        INSERT INTO salary_aggregates (employee_id, period, type, total_amount, total_hours, count)
+        VALUES ({placeholder}, {placeholder}, {placeholder}, {placeholder}, {placeholder}, {placeholder})
+        ON CONFLICT (employee_id, period, type) DO UPDATE SET
+            total_amount = salary_aggregates.total_amount + excluded.total_amount,
+            total_hours = salary_aggregates.total_hours + excluded.total_hours,
+            count = salary_aggregates.count + excluded.count
+    """, (employee_id, period, record_type, amount, hours or 0.0, count))
+    if count < 0:
+        cursor.execute(
+            f"DELETE FROM salary_aggregates WHERE employee_id = {placeholder} "
+            f"AND period = {placeholder} AND type = {placeholder} AND count <= 0",
+            (employee_id, period, record_type)
+        )
+
+
+def rebuild_salary_aggregates():
+    """
+    Recalcule salary_aggregates depuis salaries (données existantes ou dérive).
+    Retourne le nombre de lignes d'agrégats produites.
+    """
+    with db_connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute("DELETE FROM salary_aggregates")
+        cursor.execute("""
+            INSERT INTO salary_aggregates (employee_id, period, type, total_amount, total_hours, count)
+            SELECT employee_id, period, type,
+                   SUM(amount), SUM(COALESCE(hours_worked, 0)), COUNT(*)
+            FROM salaries
+            WHERE employee_id IS NOT NULL
+            GROUP BY employee_id, period, type
+        """)
+        rebuilt = cursor.rowcount
+        conn.commit()
+
+    logger.info(f"✅ Agrégats salaires reconstruits : {rebuilt} lignes")
+    return rebuilt
+
+
+def backfill_salary_aggregates():
+    """
+    Reconstruit salary_aggregates s'il est vide alors que salaries ne l'est pas
+    (base existante antérieure à la table d'agrégats). Sans effet sinon.
+    """
+    with db_connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute("""
+            SELECT EXISTS (SELECT 1 FROM salary_aggregates) AS has_aggregates,
+                   EXISTS (SELECT 1 FROM salaries) AS has_salaries
+        """)
+        row = cursor.fetchone()
+        cursor.close()
+
+    if row["has_salaries"] and not row["has_aggregates"]:
+        logger.info("📊 salary_aggregates vide : reconstruction depuis salaries")
+        rebuild_salary_aggregates()
+
+
+def purge_rssi_measurements(retention_hours=None, chunk_size=None, archive=None):
+    """
+    Supprime (ou archive) les mesures RSSI plus anciennes que la rétention,
+    par lots bornés pour ne pas verrouiller la table longtemps.
+    Retourne le nombre de lignes purgées.
+    """
+    retention_hours = RSSI_RETENTION_HOURS if retention_hours is None else retention_hours
+    chunk_size = RSSI_PURGE_CHUNK if chunk_size is None else chunk_size
+    archive = RSSI_ARCHIVE if archive is None else archive
+
+    placeholder = "%s" if DB_DRIVER == "postgres" else "?"
+    threshold = int((datetime.now().timestamp() - retention_hours * 3600) * 1000)
+    columns = "id, " + ", ".join(RSSI_COLUMNS)
+    total = 0
+
+    try:
+        with db_connection() as conn:
+            cur = conn.cursor()
+
+            if archive:
+                cur.execute("""
+                    CREATE TABLE IF NOT EXISTS rssi_measurements_archive (
+                        id BIGINT PRIMARY KEY,
+                        employee_id TEXT,
+                        anchor_id INTEGER NOT NULL,
+                        anchor_x REAL NOT NULL,
+                        anchor_y REAL NOT NULL,
+                        rssi INTEGER NOT NULL,
+                        mac TEXT,
+                        timestamp BIGINT NOT NULL
+                    )
+                """)
+                conn.commit()
+
+            while True:
+                cur.execute(f"""
+                    SELECT id FROM rssi_measurements
+                    WHERE timestamp < {placeholder}
+                    ORDER BY timestamp
+                    LIMIT {placeholder}
+                """, (threshold, chunk_size))
+                ids = [row[0] if DB_DRIVER == "sqlite" else row["id"] for row in cur.fetchall()]
+
+                if not ids:
+                    break
+
+                id_placeholders = ", ".join([placeholder] * len(ids))
+                if archive:
+                    cur.execute(f"""
+                        INSERT INTO rssi_measurements_archive ({columns})
+                        SELECT {columns} FROM rssi_measurements
+                        WHERE id IN ({id_placeholders})
+                    """, ids)
+                cur.execute(f"DELETE FROM rssi_measurements WHERE id IN ({id_placeholders})", ids)
+                conn.commit()
+
+                total += len(ids)
+                if len(ids) < chunk_size:
+                    break
+
+            cur.close()
+            if total:
+                action = "archivées" if archive else "supprimées"
+                logger.info(f"🧹 {total} mesures RSSI {action} (> {retention_hours}h)")
+            return total
+    except Exception as e:
+        logger.error(f"❌ purge_rssi_measurements: {e}")
+        raise
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Maintenance de la base de données")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    purge = commands.add_parser("purge-rssi", help="Purger les mesures RSSI expirées")
+    purge.add_argument("--hours", type=float, default=None, help="Rétention en heures")
+    purge.add_argument("--chunk", type=int, default=None, help="Taille des lots")
+    purge.add_argument("--archive", action="store_true", help="Archiver au lieu de supprimer")
+
+    commands.add_parser("rebuild-salary-aggregates", help="Recalculer salary_aggregates depuis salaries")
+    commands.add_parser("migrate", help="Créer les tables et index manquants, remplir les agrégats, vérifier le schéma")
+
+    args = parser.parse_args()
+
+    if args.command == "purge-rssi":
+        purge_rssi_measurements(args.hours, args.chunk, args.archive or None)
+    elif args.command == "rebuild-salary-aggregates":
+        rebuild_salary_aggregates()
+    elif args.command == "migrate":
+        migrate()
@@ -45,6 +45,7 @@ unsigned long lastScan = 0;
 WebSocketsClient webSocket;
 String knownEmployees[10];
 int knownCount = 0;
+String rosterEtag = "";  // ETag du dernier roster reçu (If-None-Match)
 bool wsConnected = false;
 
 // Variables pour l'affichage LCD
@@ -146,13 +147,21 @@ void setup() {
 
 void fetchEmployees() {
   HTTPClient http;
-  http.begin("https://postcam-1.onrender.com/api/employees");
+  http.begin("https://postcam-1.onrender.com/api/badges/roster");
   http.setTimeout(15000);
+  const char* headerKeys[] = {"ETag"};
+  http.collectHeaders(headerKeys, 1);
+  if (rosterEtag.length() > 0 && knownCount > 0) {
+    http.addHeader("If-None-Match", rosterEtag);
+  }
   
   Serial.println("📥 Récupération liste employés...");
   int httpCode = http.GET();
   
-  if (httpCode == 200) {
+  if (httpCode == 304) {
+    Serial.println("✅ Liste employés inchangée (" + String(knownCount) + " employés)");
+  } else if (httpCode == 200) {
+    rosterEtag = http.header("ETag");
     String payload = http.getString();
     Serial.println("✅ Réponse reçue (" + String(payload.length()) + " octets)");
     StaticJsonDocument<4096> doc;
@@ -162,10 +171,8 @@ void fetchEmployees() {
       knownCount = min((int)employees.size(), 10);
       Serial.println("📋 " + String(knownCount) + " employés chargés:");
       for (int i = 0; i < knownCount; i++) {
-        String nom = employees[i]["nom"].as<String>();
-        String prenom = employees[i]["prenom"].as<String>();
-        
-        String fullName = nom + " " + prenom;
+        // "name" = "Nom Prénom", tel que diffusé dans le SSID du badge
+        String fullName = employees[i]["name"].as<String>();
         //fullName.toLowerCase();
         knownEmployees[i] = fullName;
         Serial.println("  " + String(i+1) + ". " + knownEmployees[i]);